@@ -0,0 +1,120 @@
+# 基于 asyncio 的并发爬虫
+# 同时进行的请求数不超过 concurrency, 同一主机每秒的请求数不超过 rate_per_host
+# 阻塞的 getHtml 在线程中执行, 网页解析仍使用 get_data 中的 parse_movie / parse_index_page
+# 结果按输入链接的顺序返回, 与逐个爬取的结果相同
+# 所有地址都由 base_url 拼出, 可以指向 page_server.py 启动的本地服务器进行测试
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+from fetch import getHtml
+from get_data import TOP250_URL, parse_index_page, parse_movie
+
+
+class HostRateLimiter:
+    """
+    每个主机两次请求之间至少间隔 1 / rate 秒
+    """
+
+    def __init__(self, rate=None):
+        """
+        :param rate: 每个主机每秒最多的请求数, None 表示不限制
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = {}
+        # 主机 -> 下一次允许请求的时间
+
+    async def wait(self, url: str) -> None:
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        now = time.monotonic()
+        start = max(now, self.next_time.get(host, now))
+        self.next_time[host] = start + self.interval
+        # 先预订时间再等待, 同一主机的请求依次排开
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class AsyncCrawler:
+    """
+    并发下载网页, 用法: await AsyncCrawler(concurrency=8).fetch_all(urls), 使用完毕后调用 close()
+    """
+
+    def __init__(self, concurrency=8, rate_per_host=None, fetch=getHtml):
+        """
+        :param concurrency: 最多同时进行的请求数
+        :param rate_per_host: 每个主机每秒最多的请求数, None 表示不限制
+        :param fetch: 阻塞的下载函数, 参数为 url, 返回 requests.Response
+        """
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.limiter = HostRateLimiter(rate_per_host)
+        self.fetch = fetch
+        self.executor = ThreadPoolExecutor(concurrency)
+        # 默认线程池的线程数与 CPU 数有关, 会限制并发数
+
+    async def fetch_text(self, url: str) -> str:
+        async with self.semaphore:
+            await self.limiter.wait(url)
+            res = await asyncio.get_running_loop().run_in_executor(self.executor, self.fetch, url)
+            return res.text
+
+    async def fetch_all(self, urls: list) -> list:
+        """
+        :param urls:
+        :return: list, 与 urls 顺序相同的网页文本
+        """
+        return await asyncio.gather(*[self.fetch_text(url) for url in urls])
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+
+async def crawl_movie_urls(crawler: AsyncCrawler, base_url=TOP250_URL) -> list:
+    """
+    先下载第一页, 再从分页栏得到其余各页并发下载; 没有分页栏时沿下一页链接逐页下载
+    电影链接换到 base_url 的主机上(豆瓣上两者相同), 本地测试时保存的网页无需修改
+    :param crawler:
+    :param base_url: 分类界面的地址
+    :return: list, 按榜单顺序排列的电影链接
+    """
+    movie_urls, page_urls, next_url = parse_index_page(await crawler.fetch_text(base_url), base_url)
+    page_urls = [url for url in dict.fromkeys(page_urls) if url != base_url]
+    # 分页栏中的链接可能重复
+    if page_urls:
+        for html in await crawler.fetch_all(page_urls):
+            movie_urls.extend(parse_index_page(html, base_url)[0])
+    else:
+        while next_url:
+            page_movie_urls, _, next_url = parse_index_page(await crawler.fetch_text(next_url), base_url)
+            movie_urls.extend(page_movie_urls)
+    scheme, netloc = urlsplit(base_url)[:2]
+    return [urlunsplit((scheme, netloc) + urlsplit(url)[2:]) for url in movie_urls]
+
+
+async def crawl_top250(base_url=TOP250_URL, concurrency=8, rate_per_host=None, fetch=getHtml) -> list:
+    """
+    并发爬取榜单中所有电影的信息
+    :param base_url: 分类界面的地址
+    :param concurrency: 最多同时进行的请求数
+    :param rate_per_host: 每个主机每秒最多的请求数
+    :param fetch: 阻塞的下载函数
+    :return: list, 按榜单顺序排列, 每项为 parse_movie 的结果
+    """
+    crawler = AsyncCrawler(concurrency, rate_per_host, fetch)
+    done = 0
+
+    async def crawl_movie(url):
+        nonlocal done
+        movie = parse_movie(await crawler.fetch_text(url))
+        done += 1
+        print(f"Progress:{done}/{len(movie_urls)}")
+        return movie
+
+    try:
+        movie_urls = await crawl_movie_urls(crawler, base_url)
+        return await asyncio.gather(*[crawl_movie(url) for url in movie_urls])
+    finally:
+        crawler.close()
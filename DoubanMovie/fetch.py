@@ -0,0 +1,185 @@
+# 共用的网页下载模块
+# 所有请求共用一个 requests.Session, 连接池保持长连接, 不必每个网页重新建立 TCP/TLS 连接
+# 超时、连接错误以及 429/5xx 响应按指数退避重试, 等待时间有上限并加入随机抖动, 避免被限流时集中重试
+# 记录每个请求的延迟和重试次数, 用 get_metrics() 查看
+# 调用 enable_cache() 后使用 http_cache.HttpCache 磁盘缓存, 未过期的网页不再请求, 过期的网页用条件请求重新验证
+
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import HttpCache
+
+HEADERS = {
+    'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_13_6) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/91.0.4472.114 Safari/537.36',
+    'accept-language': 'zh-CN,zh;q=0.9',
+    'cache-control': 'max-age=0',
+    'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8'
+}
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def make_session(pool_size=16) -> requests.Session:
+    """
+    :param pool_size: 每个主机最多保持的连接数, 应不小于并发数
+    :return: requests.Session
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+session = make_session()
+
+
+class FetchMetrics:
+    """
+    请求数、重试次数、失败次数和每个请求的延迟(包括重试的等待时间)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.cache_hits = 0
+        self.revalidated = 0
+        self.latencies = []
+
+    def record(self, latency: float, retries: int, failed: bool, cache=None) -> None:
+        """
+        :param cache: None 表示请求了网络, 'hit' 表示直接使用缓存, 'revalidated' 表示服务器返回 304
+        """
+        with self.lock:
+            self.requests += 1
+            self.retries += retries
+            self.failures += failed
+            self.cache_hits += cache == 'hit'
+            self.revalidated += cache == 'revalidated'
+            self.latencies.append(latency)
+
+    def summary(self) -> dict:
+        with self.lock:
+            latencies = sorted(self.latencies)
+            result = {'requests': self.requests, 'retries': self.retries, 'failures': self.failures,
+                      'cache_hits': self.cache_hits, 'revalidated': self.revalidated}
+            if latencies:
+                result['mean'] = sum(latencies) / len(latencies)
+                result['p50'] = latencies[len(latencies) // 2]
+                result['p95'] = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+                result['max'] = latencies[-1]
+            return result
+
+
+metrics = FetchMetrics()
+
+
+def get_metrics() -> dict:
+    """
+    :return: dict, requests, retries, failures, cache_hits, revalidated 以及延迟的 mean, p50, p95, max(秒)
+    """
+    return metrics.summary()
+
+
+cache = None
+
+
+def enable_cache(directory='.http_cache', ttl=24 * 3600, max_bytes=256 << 20) -> HttpCache:
+    """
+    之后的 getHtml 使用磁盘缓存, 参数见 HttpCache
+    :return: HttpCache
+    """
+    global cache
+    cache = HttpCache(directory, ttl, max_bytes)
+    return cache
+
+
+def backoff_delay(attempt: int, base_delay=1.0, max_delay=60.0) -> float:
+    """
+    第 attempt 次重试前的等待时间: 在 [0, min(max_delay, base_delay * 2^attempt)] 中均匀随机选取
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def _retry_after(res: requests.Response):
+    value = res.headers.get('Retry-After')
+    if value and value.isdigit():
+        return float(value)
+    return None
+
+
+# 下载网页
+def getHtml(url, max_retries=5, base_delay=1.0, max_delay=60.0, timeout=30) -> requests.Response:
+    """
+    :param url:
+    :param max_retries: 最多重试次数, 超过后抛出最后一次的异常
+    :param base_delay: 第一次重试的最长等待时间(秒)
+    :param max_delay: 每次等待时间的上限(秒)
+    :param timeout: 单次请求的超时时间(秒)
+    :return requests.Response: 来自缓存时 from_cache 属性为 True
+    """
+    start = time.perf_counter()
+    meta = cache.get(url) if cache is not None else None
+    if meta is not None and meta['fresh']:
+        try:
+            res = cache.response(url, meta)
+            metrics.record(time.perf_counter() - start, 0, False, 'hit')
+            return res
+        except OSError:
+            meta = None
+            # 读取时已被其他线程淘汰, 重新下载
+    headers = cache.validators(meta) if meta is not None else {}
+
+    attempt = 0
+    while True:
+        retry_after = None
+        try:
+            res = session.get(url, headers=headers, timeout=timeout)
+            if res.status_code == 304 and meta is not None:
+                try:
+                    cached = cache.response(url, meta)
+                    # 网页没有变化, 使用缓存的正文
+                except OSError:
+                    meta, headers = None, {}
+                    continue
+                    # 正文已被其他线程淘汰, 不带条件重新请求
+                cache.refresh(url, meta, res)
+                metrics.record(time.perf_counter() - start, attempt, False, 'revalidated')
+                return cached
+            if res.status_code not in RETRY_STATUS:
+                res.raise_for_status()
+                # 其他错误(如 404)重试也无济于事, 直接抛出
+                res.encoding = res.apparent_encoding
+                if cache is not None:
+                    cache.put(url, res)
+                metrics.record(time.perf_counter() - start, attempt, False)
+                return res
+            error = requests.HTTPError('%d for url: %s' % (res.status_code, url), response=res)
+            retry_after = _retry_after(res)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            error = e
+        except requests.HTTPError:
+            metrics.record(time.perf_counter() - start, attempt, True)
+            raise
+
+        if attempt >= max_retries:
+            metrics.record(time.perf_counter() - start, attempt, True)
+            raise error
+        delay = backoff_delay(attempt, base_delay, max_delay)
+        if retry_after is not None:
+            delay = min(max(delay, retry_after), max_delay)
+            # 服务器给出 Retry-After 时至少等待这么久
+        print('getHtml: %s, retry in %.1f s' % (error, delay))
+        time.sleep(delay)
+        attempt += 1
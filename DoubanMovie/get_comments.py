@@ -1,29 +1,7 @@
 # 爬取短评
-import requests
 from bs4 import BeautifulSoup
 
-
-def getHtml(url) -> requests.Response:
-    """
-    :param url:
-    :return requests.Response:
-    """
-    head = {
-        'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_13_6) AppleWebKit/537.36 (KHTML, like Gecko) '
-                      'Chrome/91.0.4472.114 Safari/537.36',
-        'accept-language': 'zh-CN,zh;q=0.9',
-        'cache-control': 'max-age=0',
-        'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8'
-    }
-    while 1:
-        try:
-            res = requests.get(url, headers=head, timeout=30)
-            res.raise_for_status()
-            res.encoding = res.apparent_encoding
-            return res
-        except TimeoutError:
-            print('getHtml: request Error')
-            continue
+from fetch import enable_cache, getHtml
 
 
 def get_comments(url, filename: str) -> str:
@@ -64,11 +42,15 @@ def get_comments(url, filename: str) -> str:
     return comments
 
 
-movie_urls = [
-    'https://movie.douban.com/subject/1292052/',
-    'https://movie.douban.com/subject/1291546/'
-]
-num = 0
-for test_url in movie_urls:
-    num += 1
-    get_comments(test_url, str(num) + '.txt')
+if __name__ == '__main__':
+    enable_cache('.http_cache')
+    # 重复运行时未过期的网页直接使用缓存, 导入本模块时不创建缓存目录
+
+    movie_urls = [
+        'https://movie.douban.com/subject/1292052/',
+        'https://movie.douban.com/subject/1291546/'
+    ]
+    num = 0
+    for test_url in movie_urls:
+        num += 1
+        get_comments(test_url, str(num) + '.txt')
@@ -1,32 +1,15 @@
 # 使用requests库爬取电影信息并保存到 MovieInfo_str.csv
 
-import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 
+from fetch import getHtml
 
-# 下载网页
-def getHtml(url) -> requests.Response:
-    """
-    :param url:
-    :return requests.Response:
-    """
-    head = {
-        'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_13_6) AppleWebKit/537.36 (KHTML, like Gecko) '
-                      'Chrome/91.0.4472.114 Safari/537.36',
-        'accept-language': 'zh-CN,zh;q=0.9',
-        'cache-control': 'max-age=0',
-        'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8'
-    }
-    while 1:
-        try:
-            res = requests.get(url, headers=head, timeout=30)
-            res.raise_for_status()
-            res.encoding = res.apparent_encoding
-            return res
-        except TimeoutError:
-            print('getHtml: request Error')
-            continue
+
+TOP250_URL = 'https://movie.douban.com/top250'
+
+head = ['name', 'year', 'director', 'writers', 'actors', 'types', 'regions', 'languages', 'dates', 'length', 'rating',
+        'rating_people', 'stars']
 
 
 # 爬取单个电影信息
@@ -38,7 +21,17 @@ def get_movie(url) -> list:
     """
     # 下载网页并解析
     res = getHtml(url)
-    bs = BeautifulSoup(res.text, 'html.parser')
+    return parse_movie(res.text)
+
+
+# 解析单个电影页面
+def parse_movie(html: str) -> list:
+    """
+    从电影页面中提取信息(除短评), 预处理成合适的字符串, 返回字符串列表
+    :param html:
+    :return:
+    """
+    bs = BeautifulSoup(html, 'html.parser')
 
     name = bs.find('span', property='v:itemreviewed').text
 
@@ -87,36 +80,49 @@ def get_movie(url) -> list:
             dates_locations_str, length_str, rating_str, rating_people_str, stars_str]
 
 
+# 解析分类界面
+def parse_index_page(html: str, base_url=TOP250_URL) -> (list, list, str):
+    """
+    :param html: 分类界面(每页25部)
+    :param base_url: 分类界面的地址, 翻页链接是相对于它的查询字符串
+    :return: 本页的电影链接, 分页栏中所有页的链接, 下一页的链接(没有时为 None)
+    """
+    bs = BeautifulSoup(html, 'html.parser')
+
+    # 找到所有电影链接
+    movies_set = bs.find_all('div', class_='pic')
+    movie_urls = [movie.find('a')['href'] for movie in movies_set]
+
+    paginator = bs.find('div', class_='paginator')
+    page_urls = [base_url + page['href'] for page in paginator.find_all('a', href=True)] if paginator else []
+
+    next_url = bs.find('link', rel='next')
+    if next_url:
+        next_url = base_url + next_url['href']
+    return movie_urls, page_urls, next_url
+
+
 # 爬取所有电影信息并保存到 data.csv
-def get_all_movie_urls() -> list:
+def get_all_movie_urls(base_url=TOP250_URL) -> list:
     """
     从分类界面(每页25部)获取每部电影链接, 汇总返回 list
+    :param base_url: 分类界面的地址
     :return: list
     """
     movie_urls = []  # 创建空列表存储所有电影链接
-    top250url = 'https://movie.douban.com/top250'
+    top250url = base_url
     # 不断爬取单页信息直到最后一页
     while top250url:
         # 爬取单页所有电影信息
         # 下载网页并解析
         res = getHtml(top250url)
-        bs = BeautifulSoup(res.text, 'html.parser')
 
-        # 找到所有电影链接并添加到列表
-        movies_set = bs.find_all('div', class_='pic')
-        movie_urls.extend([movie.find('a')['href'] for movie in movies_set])
-
-        # 如果有下一页就切换到下一页
-        top250url = bs.find('link', rel='next')
-        if top250url:
-            top250url = 'https://movie.douban.com/top250' + top250url['href']
+        # 找到所有电影链接并添加到列表, 如果有下一页就切换到下一页
+        page_movie_urls, _, top250url = parse_index_page(res.text, base_url)
+        movie_urls.extend(page_movie_urls)
 
     return movie_urls
 
-
-movieUrls = get_all_movie_urls()
-# print(len(movieUrls))
-
 test_urls = [
     'https://movie.douban.com/subject/26430107/',
     'https://movie.douban.com/subject/1292052/',
@@ -131,15 +137,27 @@ test_urls = [
 #     movieInfo.append(get_movie(test_url))
 # print(movieInfo)
 
-movieInfo = []
-num = 0
-for url in movieUrls:
-    movieInfo.append(get_movie(url))
-    num += 1
-    print(f"Progress:{num}/250")
-
-head = ['name', 'year', 'director', 'writers', 'actors', 'types', 'regions', 'languages', 'dates', 'length', 'rating',
-        'rating_people', 'stars']
-movieInfoDf = pd.DataFrame(movieInfo, columns=head, dtype=str)
-movieInfoDf.to_csv('MovieInfo_str.csv', index=False, encoding='utf-8-sig')
-print(movieInfoDf.head())
+if __name__ == '__main__':
+    import asyncio
+    from fetch import enable_cache
+    from resumable_crawl import crawl_to_csv
+
+    enable_cache('.http_cache')
+    # 重复运行时未过期的网页直接使用缓存
+
+    # 并发爬取, 每部电影解析后立即写入检查点, 中断后重新运行会从断点继续
+    # 全部完成后按榜单顺序写出 MovieInfo_str.csv
+    asyncio.run(crawl_to_csv('MovieInfo_str.csv', TOP250_URL, concurrency=8, rate_per_host=4))
+
+    # 逐个爬取
+    # movieInfo = []
+    # num = 0
+    # for url in get_all_movie_urls():
+    #     movieInfo.append(get_movie(url))
+    #     num += 1
+    #     print(f"Progress:{num}/250")
+    # movieInfoDf = pd.DataFrame(movieInfo, columns=head, dtype=str)
+    # movieInfoDf.to_csv('MovieInfo_str.csv', index=False, encoding='utf-8-sig')
+
+    movieInfoDf = pd.read_csv('MovieInfo_str.csv', dtype=str, keep_default_na=False)
+    print(movieInfoDf.head())
@@ -0,0 +1,146 @@
+# 网页的磁盘缓存
+# 以 URL 为键, 每个网页保存为 gzip 压缩的正文和一个 JSON 元数据文件, 文件名为 URL 的 sha1
+# 未过期(TTL)的网页直接使用缓存; 过期后带 If-None-Match / If-Modified-Since 重新请求, 服务器返回 304 时继续使用缓存
+# 缓存总大小超过上限时按最近访问时间淘汰
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+
+class HttpCache:
+    """
+    用法: fetch.enable_cache('.http_cache'), 之后 getHtml 自动使用缓存
+    """
+
+    def __init__(self, directory='.http_cache', ttl=24 * 3600, max_bytes=256 << 20):
+        """
+        :param directory: 缓存目录
+        :param ttl: 网页的有效时间(秒)
+        :param max_bytes: 压缩后正文的总大小上限
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(os.path.getsize(os.path.join(directory, name))
+                               for name in os.listdir(directory) if name.endswith('.gz'))
+        # 只在超过上限时才扫描目录进行淘汰
+
+    def _paths(self, url: str) -> (str, str):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + '.json'), os.path.join(self.directory, key + '.gz')
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        tmp_path = path + '.tmp%d' % threading.get_ident()
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        # 先写临时文件再替换, 中断时不会留下不完整的缓存
+
+    def get(self, url: str):
+        """
+        :return: 元数据 dict, 没有缓存时为 None; 元数据中 fresh 表示是否在有效期内
+        """
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url or not os.path.exists(body_path):
+            return None
+        meta['fresh'] = time.time() < meta['expires']
+        return meta
+
+    def response(self, url: str, meta: dict) -> requests.Response:
+        """
+        由缓存构造 requests.Response, 其 from_cache 属性为 True
+        """
+        _, body_path = self._paths(url)
+        with open(body_path, 'rb') as f:
+            body = gzip.decompress(f.read())
+        os.utime(body_path)
+        # 正文文件的修改时间作为最近访问时间, 用于淘汰
+        res = requests.Response()
+        res._content = body
+        res.status_code = 200
+        res.url = url
+        res.headers.update(meta['headers'])
+        res.encoding = meta['encoding']
+        res.from_cache = True
+        return res
+
+    def validators(self, meta: dict) -> dict:
+        """
+        :return: dict, 重新验证用的条件请求头
+        """
+        headers = {}
+        if meta['headers'].get('ETag'):
+            headers['If-None-Match'] = meta['headers']['ETag']
+        if meta['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = meta['headers']['Last-Modified']
+        return headers
+
+    def put(self, url: str, res: requests.Response) -> None:
+        meta_path, body_path = self._paths(url)
+        body = gzip.compress(res.content)
+        headers = {name: res.headers[name] for name in ('ETag', 'Last-Modified', 'Content-Type')
+                   if name in res.headers}
+        meta = {'url': url, 'headers': headers, 'encoding': res.encoding, 'size': len(body),
+                'expires': time.time() + self.ttl}
+        with self.lock:
+            if os.path.exists(body_path):
+                self.total_bytes -= os.path.getsize(body_path)
+            self._write(body_path, body)
+            self._write(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+            self.total_bytes += len(body)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def refresh(self, url: str, meta: dict, res: requests.Response) -> None:
+        """
+        服务器返回 304 后延长有效期, 并更新服务器给出的新验证器
+        """
+        meta_path, _ = self._paths(url)
+        meta = dict(meta, expires=time.time() + self.ttl)
+        meta.pop('fresh', None)
+        for name in ('ETag', 'Last-Modified'):
+            if name in res.headers:
+                meta['headers'][name] = res.headers[name]
+        with self.lock:
+            self._write(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+    def _evict(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.gz'):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        self.total_bytes = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            for remove_path in (path[:-len('.gz')] + '.json', path):
+                try:
+                    os.remove(remove_path)
+                except FileNotFoundError:
+                    pass
+            self.total_bytes -= size
+            # 最久未访问的先淘汰
+
+    def clear(self) -> None:
+        with self.lock:
+            for name in os.listdir(self.directory):
+                if name.endswith(('.gz', '.json')):
+                    os.remove(os.path.join(self.directory, name))
+            self.total_bytes = 0
@@ -0,0 +1,71 @@
+# 本地测试服务器: 提供保存在目录中的网页, 代替豆瓣网站测试爬虫
+# 网页文件名为地址的路径和查询字符串经 quote 编码后的结果, 由 save_page 保存
+# 用法: python page_server.py pages 8000, 然后以 http://127.0.0.1:8000/top250 作为 base_url 爬取
+
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, urlsplit
+
+
+def page_file(directory: str, url: str) -> str:
+    """
+    :param directory: 保存网页的目录
+    :param url: 完整地址或以 / 开头的路径
+    :return: 网页文件的路径, 与主机无关
+    """
+    parts = urlsplit(url)
+    path = parts.path + ('?' + parts.query if parts.query else '')
+    return os.path.join(directory, quote(path, safe='') + '.html')
+
+
+def save_page(directory: str, url: str, html: str) -> None:
+    os.makedirs(directory, exist_ok=True)
+    with open(page_file(directory, url), 'w', encoding='utf-8') as f:
+        f.write(html)
+
+
+def serve_pages(directory: str, host='127.0.0.1', port=0, delay=0.0) -> ThreadingHTTPServer:
+    """
+    在后台线程中启动服务器
+    :param directory: 保存网页的目录
+    :param host:
+    :param port: 0 表示任选一个空闲端口, 实际端口为 server.server_address[1]
+    :param delay: 每个请求的模拟延迟(秒)
+    :return: ThreadingHTTPServer, 使用完毕后调用 shutdown()
+    """
+
+    class PageHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            filename = page_file(directory, self.path)
+            if not os.path.exists(filename):
+                self.send_error(404)
+                return
+            with open(filename, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), PageHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    server = serve_pages(sys.argv[1], port=int(sys.argv[2]) if len(sys.argv) > 2 else 8000)
+    print("Serving %s on http://%s:%d" % (sys.argv[1], *server.server_address))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
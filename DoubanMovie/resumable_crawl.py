@@ -0,0 +1,170 @@
+# 可断点续爬的电影信息爬虫
+# 榜单中的电影链接(待爬取的队列)先保存到 <output>.checkpoint.json
+# 每解析完一部电影就追加一行到 <output>.checkpoint.jsonl 并写入磁盘, 重新运行时跳过已完成的电影, 崩溃只损失正在爬取的网页
+# 固定数目的协程从队列中取链接, 电影信息写入检查点后不保留在内存中, 内存中只有链接和每行的偏移
+# 重试也不会成功的失败(429 以外的 4xx 响应, 或 parse_movie 出错)记入检查点并跳过, 不会因为一个网页使整个爬取无法完成
+# 超时、连接错误和重试用尽的 429/5xx 等暂时的失败不记入检查点, 本次不写出 CSV, 保留检查点, 重新运行时重试
+# 写检查点和 fsync 在单独的线程中按顺序执行, 不阻塞事件循环中的其他协程
+# 全部完成后按榜单顺序写出 CSV(格式与 get_data.py 原来的输出相同), 列出失败的电影, 并删除检查点文件
+
+import asyncio
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from async_crawler import AsyncCrawler, crawl_movie_urls
+from fetch import getHtml
+from get_data import TOP250_URL, head, parse_movie
+
+
+def _write_json(path: str, data) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _open_journal(path: str) -> (object, dict, dict):
+    """
+    打开已完成电影的记录文件, 去掉崩溃时写了一半的最后一行
+    :return: 追加写入的文件对象, {排名: 该行在文件中的偏移}, {排名: (链接, 失败原因)}
+    """
+    offsets = {}
+    failed = {}
+    end = 0
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                    if 'error' in record:
+                        failed[record['rank']] = (record['url'], record['error'])
+                    else:
+                        offsets[record['rank']] = end
+                except (ValueError, KeyError):
+                    break
+                end += len(line)
+        with open(path, 'r+b') as f:
+            f.truncate(end)
+    journal = open(path, 'ab')
+    journal.seek(0, os.SEEK_END)
+    return journal, offsets, failed
+
+
+def _append_record(journal, record: dict, fsync: bool) -> int:
+    """
+    :return: 该行在文件中的偏移
+    """
+    offset = journal.tell()
+    journal.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+    journal.flush()
+    if fsync:
+        os.fsync(journal.fileno())
+    return offset
+
+
+def _is_permanent(error: Exception) -> bool:
+    """
+    下载时的异常是否重试也不会成功: 429 以外的 4xx 响应
+    """
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return 400 <= error.response.status_code < 500 and error.response.status_code != 429
+    return False
+
+
+async def crawl_to_csv(output='MovieInfo_str.csv', base_url=TOP250_URL, concurrency=8, rate_per_host=None,
+                       fetch=getHtml, fsync=True) -> int:
+    """
+    :param output: 输出的 CSV 文件
+    :param base_url: 分类界面的地址
+    :param concurrency: 最多同时进行的请求数
+    :param rate_per_host: 每个主机每秒最多的请求数
+    :param fetch: 阻塞的下载函数
+    :param fsync: 每写一行都调用 fsync, 保证断电后不丢失已完成的电影
+    :return: 写入 CSV 的电影数目
+    :raise RuntimeError: 有电影暂时下载失败, 此时不写出 CSV, 保留检查点, 重新运行时重试这些电影
+    """
+    state_path, journal_path = output + '.checkpoint.json', output + '.checkpoint.jsonl'
+    crawler = AsyncCrawler(concurrency, rate_per_host, fetch)
+    try:
+        if os.path.exists(state_path):
+            with open(state_path, encoding='utf-8') as f:
+                movie_urls = json.load(f)['movie_urls']
+        else:
+            movie_urls = await crawl_movie_urls(crawler, base_url)
+            _write_json(state_path, {'base_url': base_url, 'movie_urls': movie_urls})
+
+        journal, offsets, failed = _open_journal(journal_path)
+        pending = iter([(rank, url) for rank, url in enumerate(movie_urls)
+                        if rank not in offsets and rank not in failed])
+        done = len(offsets) + len(failed)
+        print(f"Resume from:{done}/{len(movie_urls)}")
+        journal_executor = ThreadPoolExecutor(1)
+        # 只用一个线程写检查点, 各行依次写入, 偏移不会错乱
+        loop = asyncio.get_running_loop()
+
+        unresolved = {}
+        # 暂时失败的电影 {排名: (链接, 失败原因)}, 不写入检查点
+
+        async def worker():
+            nonlocal done
+            for rank, url in pending:
+                # 各协程共用同一个迭代器, 每个链接只被取出一次
+                try:
+                    html = await crawler.fetch_text(url)
+                except Exception as e:
+                    if not _is_permanent(e):
+                        unresolved[rank] = (url, f"{type(e).__name__}: {e}")
+                        print(f"Retry later:{url} {unresolved[rank][1]}")
+                        continue
+                    record = {'rank': rank, 'url': url, 'error': f"{type(e).__name__}: {e}"}
+                else:
+                    try:
+                        record = {'rank': rank, 'url': url, 'movie': parse_movie(html)}
+                    except Exception as e:
+                        record = {'rank': rank, 'url': url, 'error': f"{type(e).__name__}: {e}"}
+                        # 网页缺少字段, 重新下载也一样
+                if 'error' in record:
+                    print(f"Failed:{url} {record['error']}")
+                offset = await loop.run_in_executor(journal_executor, _append_record, journal, record, fsync)
+                if 'error' in record:
+                    failed[rank] = (url, record['error'])
+                else:
+                    offsets[rank] = offset
+                done += 1
+                print(f"Progress:{done}/{len(movie_urls)}")
+
+        try:
+            await asyncio.gather(*[worker() for _ in range(concurrency)])
+        finally:
+            journal_executor.shutdown()
+            journal.close()
+    finally:
+        crawler.close()
+
+    if unresolved:
+        for rank in sorted(unresolved):
+            print(f"Unresolved:{rank + 1} {unresolved[rank][0]} {unresolved[rank][1]}")
+        raise RuntimeError(f"{len(unresolved)} movies failed temporarily, "
+                           f"checkpoint kept in {journal_path}, run again to retry them")
+
+    with open(journal_path, 'rb') as journal, open(output, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(head)
+        for rank in sorted(offsets):
+            journal.seek(offsets[rank])
+            writer.writerow(json.loads(journal.readline())['movie'])
+            # 按榜单顺序逐行读出, 不把全部电影读入内存
+    for rank in sorted(failed):
+        print(f"Skipped:{rank + 1} {failed[rank][0]} {failed[rank][1]}")
+    # 失败的电影不写入 CSV, 在最后列出
+    os.remove(state_path)
+    os.remove(journal_path)
+    return len(offsets)
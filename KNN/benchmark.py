@@ -0,0 +1,206 @@
+# KNN 性能基准测试
+# 参照 data_generator.py 的做法，在若干基准样本附近加入随机扰动生成指定规模的数据集
+# 对每条预测路径记录吞吐量、延迟分位数和内存峰值，结果写入 JSON 文件，可以与其他提交的结果对比
+# 用法: python benchmark.py --grid quick --output bench.json [--compare old.json]
+
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+
+from myKNN import KDTREE_MAX_DIM, autoNorm, buildIndex, classify0, classify1, classifyBatch, dataSetSplit
+
+GRIDS = {
+    'quick': {'n': [1000, 10000], 'd': [4, 16], 'k': [1, 5], 'classes': [3]},
+    'full': {'n': [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7], 'd': [4, 16, 64, 512],
+             'k': [1, 5, 25], 'classes': [3, 10, 100]},
+}
+# 每个网格点为 n 行 d 列、classes 个类别的数据集，在其上测试每个 k 值
+
+PATHS = ['classify0', 'classify1', 'batch', 'batch-weighted', 'batch-jit', 'kdtree', 'rpforest']
+
+
+def makeDataset(n, d, numClasses, noise=0.1, seed=None):
+    """
+    生成合成数据集：每个类别随机取一个基准样本，新样本为基准样本加上正态分布扰动
+    :param n: 样本数
+    :param d: 特征数
+    :param numClasses: 类别数
+    :param noise: 扰动的标准差
+    :param seed: 随机种子
+    :return: dataSet, labelCodes
+    """
+    rng = np.random.default_rng(seed)
+    baseSamples = rng.uniform(0.0, 1.0, (numClasses, d))
+    labelCodes = rng.integers(0, numClasses, n)
+    dataSet = baseSamples[labelCodes] + rng.normal(0.0, noise, (n, d))
+    return dataSet, labelCodes
+
+
+def _percentiles(latencies):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+
+def _peakMemory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def timeCalls(func, batches):
+    """
+    依次对每批数据调用 func，记录每次调用的延迟
+    :return: list, 每次调用的秒数
+    """
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        func(batch)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def benchPath(path, trainSet, labelCodes, queries, k, batchSize):
+    """
+    测试一条预测路径
+    :return: dict, 吞吐量、延迟分位数、内存峰值和索引构建时间
+    """
+    result = {'path': path, 'buildSeconds': 0.0}
+    if path in ('classify0', 'classify1'):
+        classify = classify0 if path == 'classify0' else classify1
+        predict = lambda x: classify(x[0], trainSet, labelCodes, k)
+        batches = [queries[i:i + 1] for i in range(queries.shape[0])]
+        # 逐行分类的路径每次只处理一个样本
+    else:
+        index = None
+        if path in ('kdtree', 'rpforest'):
+            start = time.perf_counter()
+            index = buildIndex(trainSet, path)
+            result['buildSeconds'] = time.perf_counter() - start
+        weighted = path == 'batch-weighted'
+        jit = path == 'batch-jit'
+        predict = lambda x: classifyBatch(x, trainSet, labelCodes, k, weighted, index, jit)
+        batches = [queries[i:i + batchSize] for i in range(0, queries.shape[0], batchSize)]
+
+    latencies = timeCalls(predict, batches)
+    result['queries'] = int(queries.shape[0])
+    result['throughput'] = queries.shape[0] / sum(latencies)
+    result['latency'] = _percentiles(latencies)
+    result['peakBytes'] = _peakMemory(lambda: predict(batches[0]))
+    # 内存单独测量一次，避免 tracemalloc 的开销影响计时
+    return result
+
+
+def runBenchmark(grid='quick', paths=PATHS, numQueries=1000, numRowQueries=50, batchSize=256,
+                 maxBytes=8 << 30, seed=0):
+    """
+    在网格的每个数据集上测试每条预测路径，以及 autoNorm 和 dataSetSplit
+    :param grid: GRIDS 中的网格名称
+    :param paths: 需要测试的预测路径
+    :param numQueries: 批量路径的查询数
+    :param numRowQueries: 逐行路径(classify0/classify1)的查询数
+    :param batchSize: 批量路径每次调用的查询数
+    :param maxBytes: 数据集超过该大小时跳过
+    :param seed: 随机种子
+    :return: list, 每项为一次测试的结果
+    """
+    sizes = GRIDS[grid]
+    results = []
+    for n in sizes['n']:
+        for d in sizes['d']:
+            for numClasses in sizes['classes']:
+                case = {'n': n, 'd': d, 'classes': numClasses}
+                if n * d * 8 * 2 > maxBytes:
+                    results.append(dict(case, skipped='dataset larger than maxBytes'))
+                    continue
+                print("n = {:}, d = {:}, classes = {:}".format(n, d, numClasses))
+                dataSet, labelCodes = makeDataset(n + numQueries, d, numClasses, seed=seed)
+
+                start = time.perf_counter()
+                normDataSet, minVals, ranges = autoNorm(dataSet)
+                results.append(dict(case, path='autoNorm', seconds=time.perf_counter() - start,
+                                    peakBytes=_peakMemory(lambda: autoNorm(dataSet))))
+                start = time.perf_counter()
+                dataSetSplit(normDataSet, labelCodes, 0.2, np.random.default_rng(seed))
+                results.append(dict(case, path='dataSetSplit', seconds=time.perf_counter() - start))
+
+                trainSet, queries = normDataSet[numQueries:], normDataSet[:numQueries]
+                trainCodes = labelCodes[numQueries:]
+                for k in sizes['k']:
+                    for path in paths:
+                        if path == 'kdtree' and d > KDTREE_MAX_DIM:
+                            continue
+                        pathQueries = queries[:numRowQueries] if path in ('classify0', 'classify1') else queries
+                        result = benchPath(path, trainSet, trainCodes, pathQueries, k, batchSize)
+                        results.append(dict(case, k=k, **result))
+                        print("  k = {:}, {:}: {:.1f} queries/s, p99 {:.3g} s".format(
+                            k, path, result['throughput'], result['latency']['p99']))
+    return results
+
+
+def _metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'machine': platform.machine(), 'processor': platform.processor()}
+
+
+def _key(result):
+    return tuple(result.get(name) for name in ('n', 'd', 'classes', 'k', 'path'))
+
+
+def compareResults(baseFile, newFile, tolerance=0.1):
+    """
+    对比两次基准测试，吞吐量下降或耗时增加超过 tolerance 的项视为退化
+    :param baseFile: 作为基准的结果文件
+    :param newFile: 新的结果文件
+    :param tolerance: 允许的相对变化
+    :return: list, 退化项的 (key, 基准值, 新值)
+    """
+    with open(baseFile, encoding='utf-8') as file:
+        base = {_key(result): result for result in json.load(file)['results']}
+    with open(newFile, encoding='utf-8') as file:
+        new = json.load(file)['results']
+
+    regressions = []
+    for result in new:
+        old = base.get(_key(result))
+        if old is None or 'skipped' in result or 'skipped' in old:
+            continue
+        if 'throughput' in result:
+            if result['throughput'] < old['throughput'] * (1 - tolerance):
+                regressions.append((_key(result), old['throughput'], result['throughput']))
+        elif result['seconds'] > old['seconds'] * (1 + tolerance):
+            regressions.append((_key(result), old['seconds'], result['seconds']))
+    for key, oldValue, newValue in regressions:
+        print("Regression {:}: {:.4g} -> {:.4g}".format(key, oldValue, newValue))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='KNN benchmark')
+    parser.add_argument('--grid', choices=list(GRIDS), default='quick')
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=PATHS)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--max-bytes', type=int, default=8 << 30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--compare', help='baseline result file to compare against')
+    args = parser.parse_args()
+
+    results = runBenchmark(args.grid, args.paths, args.queries, batchSize=args.batch_size,
+                           maxBytes=args.max_bytes, seed=args.seed)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump({'meta': _metadata(), 'results': results}, file, indent=2)
+    if args.compare:
+        compareResults(args.compare, args.output)
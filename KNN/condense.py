@@ -0,0 +1,135 @@
+# 训练集压缩(原型选择)
+# 剪辑近邻(ENN)：去掉与其 k 个近邻多数标签不一致的样本，去除噪声和类别边界上的重叠
+# 压缩近邻(CNN)：只保留用 1-NN 分类时必需的样本，去除类别内部的冗余样本
+# 两者通常先 ENN 后 CNN，用少量原型代替整个训练集以加快查询
+# CNN 得到的原型集只保证 1-NN 分类结果不变，k 较大时原型过于稀疏，应只使用 ENN
+
+import time
+import numpy as np
+
+from cross_validation import leaveOneOutNeighbors
+from myKNN import autoNorm, classifyBatch, dataSetSplit, file2codes, kNeighbors, voteLabels
+
+
+def editedNearestNeighbor(dataSet, labelCodes, k=3):
+    """
+    Wilson 剪辑近邻
+    :param dataSet: ndarray, (n, d) 归一化后的训练样本集
+    :param labelCodes: ndarray, encodeLabels 编码后的标签
+    :param k: 近邻数目
+    :return: ndarray, 保留的样本下标
+    """
+    labelCodes = np.asarray(labelCodes)
+    distances, indices = leaveOneOutNeighbors(dataSet, k)
+    # 一次计算所有样本在其余样本中的近邻
+    return np.flatnonzero(voteLabels(indices, distances, labelCodes) == labelCodes)
+
+
+def condensedNearestNeighbor(dataSet, labelCodes, blockSize=256, rng=None):
+    """
+    Hart 压缩近邻：从每类一个样本开始，把当前原型集用 1-NN 分错的样本加入原型集，直到一轮中没有分错的样本
+    每次用当前原型集批量求出 blockSize 个样本的最近原型，之后按顺序处理：分错的样本加入原型集后，
+    只需计算块内剩余样本到新原型的距离来更新最近原型，结果与逐个样本的原始算法相同
+    :param dataSet: ndarray, (n, d) 归一化后的训练样本集
+    :param labelCodes: ndarray, encodeLabels 编码后的标签
+    :param blockSize: 每批分类的样本数
+    :param rng: np.random.Generator
+    :return: ndarray, 保留的样本下标
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    labelCodes = np.asarray(labelCodes)
+    order = rng.permutation(labelCodes.size)
+    _, firstOfClass = np.unique(labelCodes[order], return_index=True)
+    isPrototype = np.zeros(labelCodes.size, dtype=bool)
+    isPrototype[order[firstOfClass]] = True
+
+    changed = True
+    while changed:
+        changed = False
+        for start in range(0, order.size, blockSize):
+            block = order[start:start + blockSize]
+            block = block[~isPrototype[block]]
+            if block.size == 0:
+                continue
+            prototypes = np.flatnonzero(isPrototype)
+            distances, nearest = kNeighbors(dataSet[block], dataSet[prototypes], 1)
+            distances = distances[:, 0] ** 2
+            predicted = labelCodes[prototypes[nearest[:, 0]]]
+            # 块内每个样本到当前原型集的最近平方距离及该原型的标签
+
+            position = 0
+            while True:
+                wrong = np.flatnonzero(predicted[position:] != labelCodes[block[position:]])
+                if wrong.size == 0:
+                    break
+                position += wrong[0]
+                added = block[position]
+                isPrototype[added] = True
+                changed = True
+                position += 1
+                rest = block[position:]
+                sqDistances = ((dataSet[rest] - dataSet[added]) ** 2).sum(axis=1)
+                closer = sqDistances < distances[position:]
+                distances[position:][closer] = sqDistances[closer]
+                predicted[position:][closer] = labelCodes[added]
+                # 第一个分错的样本成为原型，块内其后的样本重新检查
+    return np.flatnonzero(isPrototype)
+
+
+def selectPrototypes(dataSet, labelCodes, method='enn+cnn', k=3, blockSize=256, rng=None):
+    """
+    :param method: 'enn'、'cnn' 或 'enn+cnn'
+    :return: ndarray, 保留的样本下标
+    """
+    labelCodes = np.asarray(labelCodes)
+    kept = np.arange(labelCodes.size)
+    if 'enn' in method.split('+'):
+        kept = kept[editedNearestNeighbor(dataSet[kept], labelCodes[kept], k)]
+    if 'cnn' in method.split('+'):
+        kept = kept[condensedNearestNeighbor(dataSet[kept], labelCodes[kept], blockSize, rng)]
+    return kept
+
+
+def condenseReport(filename, k, method='enn+cnn', testRatio=0.2, testTimes=10, seed=None):
+    """
+    使用与 KNNTest0 相同的随机划分测试：每次划分后压缩训练集，对比压缩前后的错误率和查询耗时，输出压缩比
+    CNN 的原型集只保证 1-NN 的分类结果，包含 CNN 时压缩后的错误率用 1-NN 计算
+    :param filename:
+    :param k:
+    :param method: 见 selectPrototypes
+    :param testRatio:
+    :param testTimes:
+    :param seed: 随机种子
+    :return: dict, 平均压缩比、压缩前后的平均错误率和查询耗时
+    """
+    print("\nTest prototype selection ({:}) on {:}".format(method, filename))
+    print("parameter: k = {:}, test ratio = {:}".format(k, testRatio))
+
+    dataSet, labelCodes, classes, headers = file2codes(filename)
+    normdataSet, minVals, ranges = autoNorm(dataSet)
+    rng = np.random.default_rng(seed)
+    keptK = 1 if 'cnn' in method.split('+') else k
+
+    totals = np.zeros(5)
+    # 压缩比、原训练集错误率、压缩后错误率、原训练集查询耗时、压缩后查询耗时
+    for _ in range(0, testTimes):
+        xTrain, yTrain, xTest, yTest = dataSetSplit(normdataSet, labelCodes, testRatio, rng)
+        kept = selectPrototypes(xTrain, yTrain, method, k, rng=rng)
+
+        start = time.perf_counter()
+        fullErrors = (classifyBatch(xTest, xTrain, yTrain, k) != yTest).sum()
+        middle = time.perf_counter()
+        keptErrors = (classifyBatch(xTest, xTrain[kept], yTrain[kept], keptK) != yTest).sum()
+        end = time.perf_counter()
+
+        totals += [kept.size / float(len(yTrain)), fullErrors / float(len(yTest)),
+                   keptErrors / float(len(yTest)), middle - start, end - middle]
+    compressionRatio, fullErrorRate, keptErrorRate, fullSeconds, keptSeconds = totals / testTimes
+
+    print("The average compression ratio is: {:.2%} of the training set".format(compressionRatio))
+    print("The average error rate of full training set is: {:.2%}, of prototypes (k = {:}) is: {:.2%}".format(
+        fullErrorRate, keptK, keptErrorRate))
+    print("The average query time of full training set is: {:.3g} s, of prototypes is: {:.3g} s".format(
+        fullSeconds, keptSeconds))
+    return {'compressionRatio': compressionRatio, 'fullErrorRate': fullErrorRate, 'keptErrorRate': keptErrorRate,
+            'fullSeconds': fullSeconds, 'keptSeconds': keptSeconds}
@@ -0,0 +1,126 @@
+# 交叉验证
+# 划分结果只是下标数组，不复制数据集；每折的测试样本与整个数据集计算距离，测试折的列置为无穷大，不复制训练集
+# 分层 k 折保证每折中各类别的比例与整体一致；留一法只计算一次所有样本之间的近邻排序
+
+import numpy as np
+
+from myKNN import MEMORY_BUDGET, autoNorm, file2codes, kNeighbors, pairwiseDistances, topK, voteLabels
+
+
+def stratifiedKFold(labelCodes, numFolds=10, rng=None):
+    """
+    分层 k 折划分，每个类别的样本随机排列后轮流分配到各折
+    :param labelCodes: ndarray, encodeLabels 编码后的标签
+    :param numFolds: 折数
+    :param rng: np.random.Generator
+    :return: list, 每折的 (trainIndices, testIndices)
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    labelCodes = np.asarray(labelCodes)
+    folds = np.empty(labelCodes.size, dtype=np.intp)
+    offset = 0
+    for code in np.unique(labelCodes):
+        members = rng.permutation(np.flatnonzero(labelCodes == code))
+        folds[members] = (np.arange(members.size) + offset) % numFolds
+        offset += members.size
+        # 接着上一个类别的位置继续分配，各折的大小最多相差 1
+    return [(np.flatnonzero(folds != fold), np.flatnonzero(folds == fold)) for fold in range(numFolds)]
+
+
+def leaveOneOut(numSamples):
+    """
+    留一法划分
+    :param numSamples: 样本数
+    :return: 生成器，每次产生 (trainIndices, testIndices)
+    """
+    allIndices = np.arange(numSamples)
+    for i in range(numSamples):
+        yield np.delete(allIndices, i), allIndices[i:i + 1]
+
+
+def foldNeighbors(dataSet, testIndices, k, memoryBudget=MEMORY_BUDGET):
+    """
+    计算测试折中每个样本在其余样本中的 k 近邻，不复制训练集
+    :param dataSet: ndarray, (n, d) 数据集
+    :param testIndices: ndarray, 测试折的下标
+    :param k: 选择最近邻居的数目
+    :param memoryBudget: 距离矩阵最多占用的字节数
+    :return: distances, indices 均为 (len(testIndices), k) 的 ndarray，下标为 dataSet 中的下标
+    """
+    n = dataSet.shape[0]
+    k = min(k, n - testIndices.size)
+    chunk = max(memoryBudget // (n * dataSet.itemsize * 2), 1)
+    distances = np.empty((testIndices.size, k))
+    indices = np.empty((testIndices.size, k), dtype=np.intp)
+    for start in range(0, testIndices.size, chunk):
+        chunkDistances = pairwiseDistances(dataSet[testIndices[start:start + chunk]], dataSet)
+        chunkDistances[:, testIndices] = np.inf
+        # 测试折的样本不参与投票
+        distances[start:start + chunk], indices[start:start + chunk] = topK(chunkDistances, k)
+    return distances, indices
+
+
+def leaveOneOutNeighbors(dataSet, k):
+    """
+    留一法：一次计算所有样本之间的近邻排序，去掉样本自身后即为每个样本在其余样本中的 k 近邻
+    :param dataSet: ndarray, (n, d) 数据集
+    :param k: 选择最近邻居的数目
+    :return: distances, indices 均为 (n, k) 的 ndarray
+    """
+    n = dataSet.shape[0]
+    k = min(k, n - 1)
+    distances, indices = kNeighbors(dataSet, dataSet, k + 1)
+    isSelf = indices == np.arange(n)[:, np.newaxis]
+    isSelf[~isSelf.any(axis=1), -1] = True
+    # 有多个重复样本时自身可能排在 k + 1 名之外，此时去掉最后一名
+    return distances[~isSelf].reshape(n, k), indices[~isSelf].reshape(n, k)
+
+
+def crossValidate(dataSet, labelCodes, ks, numFolds=10, seed=None):
+    """
+    对每个 k 值和两种分类器进行交叉验证，每折只计算一次前 max(ks) 个邻居的排序
+    :param dataSet: ndarray, 归一化后的数据集
+    :param labelCodes: ndarray, encodeLabels 编码后的标签
+    :param ks: 需要测试的 k 值
+    :param numFolds: 折数，None 表示留一法
+    :param seed: 随机种子
+    :return: ndarray, (len(ks), 2) 的错误个数，第 0 列为普通分类器，第 1 列为加权优化分类器
+    """
+    ks = list(ks)
+    labelCodes = np.asarray(labelCodes)
+    errorCount = np.zeros((len(ks), 2), dtype=int)
+
+    if numFolds is None:
+        folds = [(np.arange(labelCodes.size), leaveOneOutNeighbors(dataSet, max(ks)))]
+    else:
+        folds = [(testIndices, foldNeighbors(dataSet, testIndices, max(ks)))
+                 for _, testIndices in stratifiedKFold(labelCodes, numFolds, np.random.default_rng(seed))]
+
+    for testIndices, (distances, indices) in folds:
+        for i, k in enumerate(ks):
+            for j, weighted in enumerate((False, True)):
+                yForecast = voteLabels(indices[:, :k], distances[:, :k], labelCodes, weighted)
+                errorCount[i, j] += int((yForecast != labelCodes[testIndices]).sum())
+    return errorCount
+
+
+def KNNCrossValidate(filename, ks, numFolds=10, seed=None):
+    """
+    读入数据并标准化，进行分层 k 折交叉验证或留一法，输出每个 k 值下两种分类器的错误个数和错误率
+    :param filename:
+    :param ks: 需要测试的 k 值
+    :param numFolds: 折数，None 表示留一法
+    :param seed: 随机种子
+    :return: ndarray, crossValidate 的结果
+    """
+    dataSet, labelCodes, classes, headers = file2codes(filename)
+    normdataSet, minVals, ranges = autoNorm(dataSet)
+
+    errorCount = crossValidate(normdataSet, labelCodes, ks, numFolds, seed)
+    print("\nCross validation on " + filename + (" (leave-one-out)" if numFolds is None
+                                                 else " ({:}-fold stratified)".format(numFolds)))
+    for k, (errorCount0, errorCount1) in zip(ks, errorCount):
+        print("k = {:}: error times of general classifier is: {:}, of optimized classifier is: {:}; "
+              "error rate {:.2%} / {:.2%}".format(k, errorCount0, errorCount1,
+                                                   errorCount0 / len(labelCodes), errorCount1 / len(labelCodes)))
+    return errorCount
@@ -1,6 +1,8 @@
-import pandas as pd
+# 生成模拟的鸢尾花数据，pandas 只在 generate_similar_samples 中使用，导入本模块时不加载
 import numpy as np
 
+from dataset_io import createBinary, writeMeta
+
 # 定义样本数据和标签
 samples = np.array([
     [5.1, 3.5, 1.4, 0.2],  # setosa
@@ -11,6 +13,8 @@ labels = ["setosa", "versicolor", "virginica"]
 
 
 def generate_similar_samples(base_samples, labels, num_samples=10):
+    import pandas as pd
+
     num_base_samples = base_samples.shape[0]
     new_samples = []
 
@@ -33,9 +37,80 @@ def generate_similar_samples(base_samples, labels, num_samples=10):
     return new_samples_df
 
 
-# 生成数据
-new_iris_data = generate_similar_samples(samples, labels, num_samples=10)
+headers = ["sepal_length", "sepal_width", "petal_length", "petal_width", "species"]
+
+
+def generate_sample_blocks(base_samples, num_samples, block_size=1000000, noise=0.1, decimals=1, seed=None):
+    """
+    按块生成数据，每块一次性生成全部扰动，内存占用只与 block_size 有关
+    与 generate_similar_samples 相同，每个基准样本生成 num_samples // num_base_samples 个样本，按基准样本顺序排列
+    :param base_samples: ndarray, 基准样本
+    :param num_samples: 生成的样本总数
+    :param block_size: 每块的行数
+    :param noise: 扰动的标准差
+    :param decimals: 保留的小数位数
+    :param seed: 随机种子，相同的种子生成相同的数据
+    :return: 生成器，每次产生 (features, label_codes)，label_codes 为对应基准样本的下标
+    """
+    rng = np.random.default_rng(seed)
+    num_base_samples, num_features = base_samples.shape
+    num_samples_per_label = num_samples // num_base_samples
+    total = num_samples_per_label * num_base_samples
+
+    for start in range(0, total, block_size):
+        end = min(start + block_size, total)
+        label_codes = np.arange(start, end) // num_samples_per_label
+        features = base_samples[label_codes] + rng.normal(0, noise, (end - start, num_features))
+        np.round(features, decimals, out=features)
+        yield features, label_codes
+
+
+def write_samples_csv(path, base_samples, labels, num_samples, block_size=1000000, noise=0.1, decimals=1,
+                      seed=None):
+    """
+    分块生成数据并逐块追加写入 CSV，格式与 generate_similar_samples 保存的文件相同
+    :return: 写入的行数
+    """
+    num_rows = 0
+    with open(path, 'w', newline='') as file:
+        file.write(','.join(headers) + '\n')
+        for features, label_codes in generate_sample_blocks(base_samples, num_samples, block_size, noise,
+                                                            decimals, seed):
+            # 同一块中标签是连续的，每段相同标签的行用一次 savetxt 写出
+            bounds = np.flatnonzero(np.diff(label_codes)) + 1
+            for rows, codes in zip(np.split(features, bounds), np.split(label_codes, bounds)):
+                label = labels[codes[0]].replace('%', '%%')
+                fmt = ','.join(['%.{:}f'.format(decimals)] * features.shape[1]) + ',' + label
+                np.savetxt(file, rows, fmt=fmt)
+            num_rows += features.shape[0]
+    return num_rows
+
+
+def write_samples_binary(prefix, base_samples, labels, num_samples, block_size=1000000, noise=0.1, decimals=1,
+                         seed=None):
+    """
+    分块生成数据并写入二进制格式(prefix.npy, prefix.labels.npy, prefix.meta.json)，可用 file2matrix(prefix + '.npy') 读入
+    :return: 写入的行数
+    """
+    total = num_samples // base_samples.shape[0] * base_samples.shape[0]
+    data_set, label_array = createBinary(prefix, total, base_samples.shape[1])
+    start = 0
+    for features, label_codes in generate_sample_blocks(base_samples, num_samples, block_size, noise,
+                                                        decimals, seed):
+        end = start + features.shape[0]
+        data_set[start:end] = features
+        label_array[start:end] = label_codes
+        start = end
+    data_set.flush()
+    label_array.flush()
+    writeMeta(prefix, headers, labels)
+    return total
+
+
+if __name__ == '__main__':
+    # 生成数据
+    new_iris_data = generate_similar_samples(samples, labels, num_samples=10)
 
-# 保存为 CSV
-output_csv_path = 'simulated_iris_data0.csv'
-new_iris_data.to_csv(output_csv_path, index=False)
+    # 保存为 CSV
+    output_csv_path = 'simulated_iris_data0.csv'
+    new_iris_data.to_csv(output_csv_path, index=False)
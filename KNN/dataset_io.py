@@ -0,0 +1,154 @@
+# 数据集读写
+# CSV 按固定行数分块解析，直接写入预先分配好的 ndarray，不再先构造整张表的字符串列表
+# 也可以把 CSV 一次性转换为二进制格式：特征为 .npy，标签为整数编码的 .labels.npy，表头和类别为 .meta.json
+# 之后的运行直接用内存映射读入，无需解析
+
+import csv
+import itertools
+import json
+import os
+import numpy as np
+
+
+def countRows(filename, blockSize=1 << 20):
+    """
+    统计文件行数(不含表头)，用于预先分配数组
+    :param filename:
+    :param blockSize: 每次读取的字节数
+    :return: 行数的上界
+    """
+    numLines = 0
+    lastByte = b'\n'
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(blockSize), b''):
+            numLines += block.count(b'\n')
+            lastByte = block[-1:]
+    if lastByte != b'\n':
+        numLines += 1
+        # 最后一行没有换行符
+    return max(numLines - 1, 0)
+
+
+def iterCsvChunks(filename, chunkRows=65536, dtype=float):
+    """
+    按块读取 CSV，最后一列为标签，其余列为特征
+    :param filename:
+    :param chunkRows: 每块的行数
+    :param dtype: 特征的数据类型
+    :return: 生成器，首先产生表头，之后每次产生 (features, labels)
+    """
+    with open(filename, newline='') as csvfile:
+        headers = next(csv.reader([csvfile.readline()]))
+        yield headers
+        numFeatures = len(headers) - 1
+        while True:
+            lines = [line for line in itertools.islice(csvfile, chunkRows) if line.strip()]
+            if not lines:
+                break
+            features = np.loadtxt(lines, delimiter=',', usecols=range(numFeatures), dtype=dtype, ndmin=2)
+            labels = [line.rsplit(',', 1)[1].strip() for line in lines]
+            yield features, labels
+
+
+def loadCsv(filename, chunkRows=65536, dtype=float):
+    """
+    分块解析 CSV 到预先分配的数组中，返回值与 file2matrix 相同
+    :param filename:
+    :param chunkRows: 每块的行数
+    :param dtype: 特征的数据类型
+    :return: dataSet, labels, headers
+    """
+    chunks = iterCsvChunks(filename, chunkRows, dtype)
+    headers = next(chunks)
+    dataSet = np.empty((countRows(filename), len(headers) - 1), dtype=dtype)
+    labels = []
+    numRows = 0
+    for features, chunkLabels in chunks:
+        dataSet[numRows:numRows + features.shape[0]] = features
+        labels.extend(chunkLabels)
+        numRows += features.shape[0]
+    return dataSet[:numRows], labels, headers
+
+
+def csvToBinary(filename, prefix, chunkRows=65536, dtype=float):
+    """
+    将 CSV 转换为二进制格式，转换过程中内存占用只与块大小有关
+    生成 prefix.npy(特征)、prefix.labels.npy(标签编码) 和 prefix.meta.json(表头和类别)
+    :param filename: CSV 文件
+    :param prefix: 输出文件名前缀
+    :param chunkRows: 每块的行数
+    :param dtype: 特征的数据类型
+    :return: None
+    """
+    chunks = iterCsvChunks(filename, chunkRows, dtype)
+    headers = next(chunks)
+    maxRows = countRows(filename)
+    dataSet, labelCodes = createBinary(prefix, maxRows, len(headers) - 1, dtype)
+    classes = {}
+    # 按第一次出现的顺序为标签编号
+    numRows = 0
+    for features, chunkLabels in chunks:
+        end = numRows + features.shape[0]
+        dataSet[numRows:end] = features
+        labelCodes[numRows:end] = [classes.setdefault(label, len(classes)) for label in chunkLabels]
+        numRows = end
+    dataSet.flush()
+    labelCodes.flush()
+    del dataSet, labelCodes
+
+    if numRows < maxRows:
+        # 文件中有空行，重新写出实际的行数
+        for suffix in ('.npy', '.labels.npy'):
+            np.save(prefix + '.tmp.npy', np.load(prefix + suffix, mmap_mode='r')[:numRows])
+            os.replace(prefix + '.tmp.npy', prefix + suffix)
+    writeMeta(prefix, headers, list(classes))
+
+
+def createBinary(prefix, numRows, numFeatures, dtype=float):
+    """
+    在磁盘上创建二进制数据集的特征文件和标签文件，返回可写的内存映射，供分块写入
+    :param prefix: 文件名前缀
+    :param numRows: 行数
+    :param numFeatures: 特征数
+    :param dtype: 特征的数据类型
+    :return: dataSet, labelCodes 两个内存映射数组
+    """
+    dataSet = np.lib.format.open_memmap(prefix + '.npy', mode='w+', dtype=dtype, shape=(numRows, numFeatures))
+    labelCodes = np.lib.format.open_memmap(prefix + '.labels.npy', mode='w+', dtype=np.int32, shape=(numRows,))
+    return dataSet, labelCodes
+
+
+def writeMeta(prefix, headers, classes):
+    """
+    写入二进制数据集的表头和类别，labelCodes 中的编码 i 对应 classes[i]
+    """
+    with open(prefix + '.meta.json', 'w', encoding='utf-8') as file:
+        json.dump({'headers': list(headers), 'classes': list(classes)}, file, ensure_ascii=False)
+
+
+def loadBinaryCodes(prefix, mmap=True):
+    """
+    读入 csvToBinary 生成的二进制数据集，标签保持为保存的整数编码，不生成每行的标签字符串
+    :param prefix: 文件名前缀，也可以是 .npy 文件名
+    :param mmap: True 时以只读方式映射特征文件，不复制数据
+    :return: dataSet, labelCodes, classes, headers; classes[labelCodes] 还原为原标签
+    """
+    if prefix.endswith('.npy'):
+        prefix = prefix[:-len('.npy')]
+    dataSet = np.load(prefix + '.npy', mmap_mode='r' if mmap else None)
+    labelCodes = np.load(prefix + '.labels.npy')
+    with open(prefix + '.meta.json', encoding='utf-8') as file:
+        meta = json.load(file)
+    return dataSet, labelCodes, meta['classes'], meta['headers']
+
+
+def loadBinary(prefix, mmap=True):
+    """
+    读入 csvToBinary 生成的二进制数据集
+    :param prefix: 文件名前缀，也可以是 .npy 文件名
+    :param mmap: True 时以只读方式映射特征文件，不复制数据
+    :return: dataSet, labels, headers
+    """
+    dataSet, labelCodes, classes, headers = loadBinaryCodes(prefix, mmap)
+    labels = [classes[code] for code in labelCodes.tolist()]
+    return dataSet, labels, headers
@@ -0,0 +1,202 @@
+# 超参数搜索：k 值、距离权值 f(x, a, b) 的参数 a、b 和投票方式(普通/加权)
+# 每次随机划分只计算一次前 max(k) 个邻居的排序，所有参数组合共用，在进程池中并行执行多次划分，数据集只复制一次到共享内存
+# 逐轮淘汰(successive halving)：先用少量划分评估全部组合，只保留错误率最低的 1/eta 进入下一轮，下一轮的划分数乘以 eta
+# 每个组合在每次划分上的结果追加写入 JSON Lines 缓存文件，中断后重新运行会跳过已完成的部分
+# 注意 a 只是缩放所有权值，不改变投票结果，默认只搜索 b
+
+import hashlib
+import itertools
+import json
+import os
+import numpy as np
+
+from myKNN import autoNorm, dataSetSplit, file2codes, kNeighbors, voteLabels
+from parallel_eval import callShared, sharedPool
+
+
+def gridConfigs(ks, bs=(0.1, 0.5, 1.0, 2.0), as_=(1.0,), weightings=(False, True)):
+    """
+    生成参数网格，普通投票与 a、b 无关，只保留一个 a = b = 1.0 的组合
+    :param ks: k 值
+    :param bs: 距离权值的参数 b
+    :param as_: 距离权值的参数 a
+    :param weightings: 投票方式，False 为普通投票，True 为距离加权投票
+    :return: list, 每项为 {'k', 'weighted', 'a', 'b'}
+    """
+    configs = []
+    for k, weighted in itertools.product(ks, weightings):
+        if weighted:
+            configs += [{'k': int(k), 'weighted': True, 'a': float(a), 'b': float(b)}
+                        for a, b in itertools.product(as_, bs)]
+        else:
+            configs.append({'k': int(k), 'weighted': False, 'a': 1.0, 'b': 1.0})
+    return configs
+
+
+def sampleConfigs(ks, bRange=(0.01, 10.0), numSamples=20, rng=None):
+    """
+    随机搜索：k 从 ks 中均匀选取，b 在 bRange 内按对数均匀分布选取
+    :return: list, 与 gridConfigs 的格式相同，重复的组合只保留一个
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    logLow, logHigh = np.log(bRange)
+    configs = []
+    for _ in range(numSamples):
+        k, weighted = int(rng.choice(ks)), bool(rng.integers(0, 2))
+        b = float(np.exp(rng.uniform(logLow, logHigh))) if weighted else 1.0
+        configs.append({'k': k, 'weighted': weighted, 'a': 1.0, 'b': b})
+    return list({_configKey(config): config for config in configs}.values())
+    # 去掉重复的组合
+
+
+def evaluateConfigs(dataSet, labels, configs, testRatio, seed):
+    """
+    在一次随机划分上评估多个参数组合
+    :param dataSet: ndarray, 归一化后的数据集
+    :param labels: ndarray, encodeLabels 编码后的标签
+    :param configs: list, 参数组合
+    :param testRatio:
+    :param seed: 本次划分的随机种子
+    :return: list, 每个组合的错误个数; 测试样本数
+    """
+    rng = np.random.default_rng(seed)
+    xTrain, yTrain, xTest, yTest = dataSetSplit(dataSet, labels, testRatio, rng)
+    distances, indices = kNeighbors(xTest, xTrain, max(config['k'] for config in configs))
+    # 所有组合共用一次近邻排序，前 k 列就是 k 个最近邻居
+    yTest = np.asarray(yTest)
+
+    errorCounts = []
+    for config in configs:
+        k = config['k']
+        yForecast = voteLabels(indices[:, :k], distances[:, :k], yTrain, config['weighted'], config['a'], config['b'])
+        errorCounts.append(int((yForecast != yTest).sum()))
+    return errorCounts, len(yTest)
+
+
+def _configKey(config):
+    return json.dumps(config, sort_keys=True)
+
+
+def _dataKey(dataSet, labels, testRatio, seed):
+    digest = hashlib.sha1(np.ascontiguousarray(dataSet).tobytes())
+    digest.update(np.ascontiguousarray(labels).tobytes())
+    digest.update(repr((testRatio, seed)).encode())
+    return digest.hexdigest()
+    # 数据集、划分比例或种子改变后，旧的缓存结果不再使用
+
+
+def _loadCache(cachePath, dataKey):
+    cache = {}
+    if cachePath is None or not os.path.exists(cachePath):
+        return cache
+    with open(cachePath, encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+                # 中断时最后一行可能不完整
+            if record.get('data') == dataKey:
+                cache[(_configKey(record['config']), record['trial'])] = (record['errorCount'], record['numTest'])
+    return cache
+
+
+def successiveHalving(dataSet, labels, configs, testRatio=0.2, minTrials=2, maxTrials=16, eta=2,
+                      workers=None, seed=None, cachePath=None):
+    """
+    逐轮淘汰搜索
+    :param dataSet: ndarray, 归一化后的数据集
+    :param labels: ndarray, encodeLabels 编码后的标签
+    :param configs: list, gridConfigs 或 sampleConfigs 生成的参数组合
+    :param testRatio:
+    :param minTrials: 第一轮的划分次数
+    :param maxTrials: 最多的划分次数
+    :param eta: 每轮保留 1/eta 的组合，划分次数乘以 eta
+    :param workers: 工作进程数目，None 表示使用全部 CPU
+    :param seed: 随机种子，第 t 次划分总是使用同一个种子，与轮次和工作进程数目无关
+    :param cachePath: JSON Lines 缓存文件，None 表示不缓存
+    :return: list, 按错误率升序排列的结果，每项为 {'config', 'trials', 'errorRate'}
+    """
+    labels = np.asarray(labels)
+    seeds = np.random.SeedSequence(seed).spawn(maxTrials)
+    dataKey = _dataKey(dataSet, labels, testRatio, seed)
+    cache = _loadCache(cachePath, dataKey)
+    configKeys = [_configKey(config) for config in configs]
+
+    alive = list(range(len(configs)))
+    trials = [0] * len(configs)
+    numTrials = min(minTrials, maxTrials)
+    with sharedPool(dataSet, labels, workers) as executor:
+        while True:
+            tasks = []
+            for trial in range(numTrials):
+                missing = [i for i in alive if (configKeys[i], trial) not in cache]
+                if missing:
+                    tasks.append((trial, missing))
+            results = executor.map(callShared, [(evaluateConfigs, [configs[i] for i in missing], testRatio,
+                                                 seeds[trial]) for trial, missing in tasks])
+            cacheFile = open(cachePath, 'a', encoding='utf-8') if cachePath is not None else None
+            try:
+                for (trial, missing), (errorCounts, numTest) in zip(tasks, results):
+                    for i, errorCount in zip(missing, errorCounts):
+                        cache[(configKeys[i], trial)] = (errorCount, numTest)
+                        if cacheFile is not None:
+                            cacheFile.write(json.dumps({'data': dataKey, 'config': configs[i], 'trial': trial,
+                                                        'errorCount': errorCount, 'numTest': numTest}) + '\n')
+                    if cacheFile is not None:
+                        cacheFile.flush()
+                        # 每完成一次划分写入一次，中断时最多丢失正在进行的划分
+            finally:
+                if cacheFile is not None:
+                    cacheFile.close()
+
+            for i in alive:
+                trials[i] = numTrials
+            if numTrials >= maxTrials or len(alive) <= 1:
+                break
+            rates = {i: _errorRate(cache, configKeys[i], numTrials) for i in alive}
+            alive = sorted(alive, key=lambda i: rates[i])[:max(len(alive) // eta, 1)]
+            # 保留错误率最低的 1/eta，错误率相同时保留靠前的组合
+            numTrials = min(numTrials * eta, maxTrials)
+
+    table = [{'config': configs[i], 'trials': trials[i], 'errorRate': _errorRate(cache, configKeys[i], trials[i])}
+             for i in range(len(configs))]
+    return sorted(table, key=lambda row: (-row['trials'], row['errorRate']))
+    # 评估次数多的组合更可靠，排在前面
+
+
+def _errorRate(cache, configKey, numTrials):
+    errorCount, numTest = np.sum([cache[(configKey, trial)] for trial in range(numTrials)], axis=0)
+    return errorCount / float(numTest)
+
+
+def KNNSearch(filename, ks, bs=(0.1, 0.5, 1.0, 2.0), numSamples=None, testRatio=0.2, minTrials=2, maxTrials=16,
+              eta=2, workers=None, seed=None, cachePath=None):
+    """
+    读入数据并标准化，搜索 k 值、a、b 和投票方式，输出结果表和最优参数
+    :param filename:
+    :param ks: k 值
+    :param bs: 网格搜索的 b 值
+    :param numSamples: 随机搜索的组合数，None 表示网格搜索
+    :param cachePath: JSON Lines 缓存文件，None 表示不缓存
+    其余参数见 successiveHalving
+    :return: 最优参数组合, 结果表
+    """
+    dataSet, labelCodes, classes, headers = file2codes(filename)
+    normdataSet, minVals, ranges = autoNorm(dataSet)
+
+    if numSamples is None:
+        configs = gridConfigs(ks, bs)
+    else:
+        configs = sampleConfigs(ks, numSamples=numSamples, rng=np.random.default_rng(seed))
+    table = successiveHalving(normdataSet, labelCodes, configs, testRatio, minTrials, maxTrials, eta,
+                              workers, seed, cachePath)
+
+    print("\nHyperparameter search on " + filename)
+    print("{:>4} {:>9} {:>6} {:>6} {:>7} {:>10}".format('k', 'weighted', 'a', 'b', 'trials', 'error rate'))
+    for row in table:
+        config = row['config']
+        print("{:>4} {:>9} {:>6.3g} {:>6.3g} {:>7} {:>10.2%}".format(
+            config['k'], str(config['weighted']), config['a'], config['b'], row['trials'], row['errorRate']))
+    print("The best configuration is: {:}".format(table[0]['config']))
+    return table[0]['config'], table
@@ -0,0 +1,105 @@
+# 分阶段计时和内存统计
+# 设置环境变量 KNN_TRACE=trace.json 或调用 enableTrace() 后，phase() 记录每个阶段的墙钟时间、CPU 时间和内存峰值
+# 未开启时 phase() 直接返回一个空的上下文管理器，几乎没有开销
+# 结果保存为 Chrome Trace Event 格式的 JSON，可直接用 chrome://tracing、Perfetto 或 speedscope 查看火焰图
+
+import atexit
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+_NULL_PHASE = contextlib.nullcontext()
+_enabled = False
+_events = []
+_stack = []
+# 正在进行的阶段，用于把内层阶段的内存峰值传递给外层阶段
+_startTime = time.perf_counter()
+
+
+def enableTrace(traceMemory=True):
+    """
+    开启记录
+    :param traceMemory: 是否使用 tracemalloc 统计内存峰值，开启后程序会明显变慢
+    :return: None
+    """
+    global _enabled
+    _enabled = True
+    if traceMemory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disableTrace():
+    global _enabled
+    _enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def isEnabled():
+    return _enabled
+
+
+@contextlib.contextmanager
+def _recordPhase(name, args):
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if _stack:
+            _stack[-1]['peak'] = max(_stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        frame = {'peak': current, 'base': current}
+    else:
+        frame = {'peak': 0, 'base': 0}
+    _stack.append(frame)
+
+    wallStart, cpuStart = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wallEnd, cpuEnd = time.perf_counter(), time.process_time()
+        _stack.pop()
+        args = dict(args, cpuSeconds=cpuEnd - cpuStart)
+        if tracing:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            if _stack:
+                _stack[-1]['peak'] = max(_stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            args['peakBytes'] = peak - frame['base']
+            # 相对于阶段开始时已分配内存的增量峰值
+        _events.append({'name': name, 'cat': 'knn', 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                        'ts': (wallStart - _startTime) * 1e6, 'dur': (wallEnd - wallStart) * 1e6, 'args': args})
+
+
+def phase(name, **args):
+    """
+    记录一个阶段，用法: with phase('autoNorm'): ...
+    :param name: 阶段名称
+    :param args: 附加信息，如第几次测试
+    :return: 上下文管理器
+    """
+    if not _enabled:
+        return _NULL_PHASE
+    return _recordPhase(name, args)
+
+
+def getEvents():
+    """
+    :return: list, 已记录的阶段，每项为一个 Trace Event
+    """
+    return list(_events)
+
+
+def writeTrace(filename):
+    """
+    将已记录的阶段写入 JSON 文件
+    """
+    with open(filename, 'w', encoding='utf-8') as file:
+        json.dump({'traceEvents': _events, 'displayTimeUnit': 'ms'}, file, indent=1)
+
+
+if os.environ.get('KNN_TRACE'):
+    enableTrace(os.environ.get('KNN_TRACE_MEMORY', '1') != '0')
+    atexit.register(writeTrace, os.environ['KNN_TRACE'])
@@ -0,0 +1,177 @@
+# 可选的 Numba 编译核函数
+# 每个分类数据逐个样本计算距离平方，用大小为 k 的最大堆维护当前的 k 近邻，最后在同一循环中投票，不产生 (m, n) 的临时数组
+# 距离相同时保留下标较小的样本，投票规则与 voteLabels 相同
+# 未安装 numba 时 classifyFused/kNeighborsFused 自动使用 kNeighbors + voteLabels 的 NumPy 实现
+# 运行 python jit_kernels.py 检查两种实现的结果是否一致
+
+import numpy as np
+
+from myKNN import encodeLabels, kNeighbors, voteLabels
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+HAVE_NUMBA = numba is not None
+
+if HAVE_NUMBA:
+    _njit = numba.njit(cache=True, nogil=True)
+    _njitParallel = numba.njit(cache=True, nogil=True, parallel=True)
+    _prange = numba.prange
+else:
+    _njit = _njitParallel = lambda func: func
+    _prange = range
+    # 没有 numba 时核函数以纯 Python 执行，只用于 checkConsistency
+
+
+@_njit
+def _worse(dist1, index1, dist2, index2):
+    return dist1 > dist2 or (dist1 == dist2 and index1 > index2)
+
+
+@_njit
+def _siftDown(heapDist, heapIndex, pos, size):
+    while True:
+        child = 2 * pos + 1
+        if child >= size:
+            return
+        if child + 1 < size and _worse(heapDist[child + 1], heapIndex[child + 1], heapDist[child], heapIndex[child]):
+            child += 1
+        if not _worse(heapDist[child], heapIndex[child], heapDist[pos], heapIndex[pos]):
+            return
+        heapDist[pos], heapDist[child] = heapDist[child], heapDist[pos]
+        heapIndex[pos], heapIndex[child] = heapIndex[child], heapIndex[pos]
+        pos = child
+
+
+@_njit
+def _searchRow(x, dataSet, k, heapDist, heapIndex):
+    """
+    在 heapDist/heapIndex 中得到 x 的 k 近邻，按距离升序排列
+    """
+    size = 0
+    for j in range(dataSet.shape[0]):
+        sqDistance = 0.0
+        for c in range(dataSet.shape[1]):
+            diff = x[c] - dataSet[j, c]
+            sqDistance += diff * diff
+        if size < k:
+            pos = size
+            size += 1
+            while pos > 0 and _worse(sqDistance, j, heapDist[(pos - 1) // 2], heapIndex[(pos - 1) // 2]):
+                heapDist[pos], heapIndex[pos] = heapDist[(pos - 1) // 2], heapIndex[(pos - 1) // 2]
+                pos = (pos - 1) // 2
+            heapDist[pos], heapIndex[pos] = sqDistance, j
+        elif sqDistance < heapDist[0]:
+            heapDist[0], heapIndex[0] = sqDistance, j
+            _siftDown(heapDist, heapIndex, 0, size)
+            # 堆顶是当前第 k 近的邻居，更近的样本替换堆顶
+    for end in range(size - 1, 0, -1):
+        heapDist[0], heapDist[end] = heapDist[end], heapDist[0]
+        heapIndex[0], heapIndex[end] = heapIndex[end], heapIndex[0]
+        _siftDown(heapDist, heapIndex, 0, end)
+        # 堆排序，得到升序
+    for r in range(size):
+        heapDist[r] = np.sqrt(heapDist[r])
+
+
+@_njit
+def _voteRow(distances, indices, labelCodes, numClasses, weighted, a, b):
+    classCount = np.zeros(numClasses)
+    for r in range(indices.shape[0]):
+        classCount[labelCodes[indices[r]]] += a / (distances[r] + b) if weighted else 1.0
+    best = classCount.max()
+    for r in range(indices.shape[0]):
+        if classCount[labelCodes[indices[r]]] == best:
+            return labelCodes[indices[r]]
+            # 票数相同时取排名最靠前的邻居所属的类
+    return 0
+
+
+@_njitParallel
+def _fusedNeighbors(inX, dataSet, k, distances, indices):
+    for i in _prange(inX.shape[0]):
+        _searchRow(inX[i], dataSet, k, distances[i], indices[i])
+
+
+@_njitParallel
+def _fusedClassify(inX, dataSet, labelCodes, k, numClasses, weighted, a, b, codes):
+    for i in _prange(inX.shape[0]):
+        heapDist = np.empty(k)
+        heapIndex = np.empty(k, dtype=np.intp)
+        _searchRow(inX[i], dataSet, k, heapDist, heapIndex)
+        codes[i] = _voteRow(heapDist, heapIndex, labelCodes, numClasses, weighted, a, b)
+
+
+def kNeighborsFused(inX, dataSet, k, useJit=HAVE_NUMBA):
+    """
+    与 kNeighbors 相同，使用编译的核函数
+    :param useJit: False 时使用 kNeighbors
+    :return: distances, indices 均为 (m, k) 的 ndarray
+    """
+    inX = np.atleast_2d(inX)
+    if not useJit:
+        return kNeighbors(inX, dataSet, k)
+    k = min(k, dataSet.shape[0])
+    distances = np.empty((inX.shape[0], k))
+    indices = np.empty((inX.shape[0], k), dtype=np.intp)
+    _fusedNeighbors(np.ascontiguousarray(inX), np.ascontiguousarray(dataSet), k, distances, indices)
+    return distances, indices
+
+
+def classifyFused(inX, dataSet, labels, k, weighted=False, a=1.0, b=1.0, useJit=HAVE_NUMBA):
+    """
+    距离计算、k 近邻选择和投票在一个编译的循环中完成，结果与 classifyBatch 的暴力搜索相同
+    :param inX: ndarray, (m, d) 分类数据
+    :param dataSet: ndarray, (n, d) 训练样本集
+    :param labels: encodeLabels 编码后的整数数组，或原始的标签列表
+    :param k: 选择最近邻居的数目
+    :param weighted: 是否使用距离权值 f
+    :param a, b: 距离权值 f 的参数
+    :param useJit: False 时使用 kNeighbors + voteLabels
+    :return: ndarray, (m,) 预测的标签，与 labels 的形式相同
+    """
+    inX = np.atleast_2d(inX)
+    if not useJit:
+        distances, indices = kNeighbors(inX, dataSet, k)
+        return voteLabels(indices, distances, labels, weighted, a, b)
+
+    labels = np.asarray(labels)
+    if labels.dtype.kind in 'iu':
+        labelCodes, classes = labels, None
+    else:
+        labelCodes, classes = encodeLabels(labels)
+    numClasses = int(labelCodes.max()) + 1 if labelCodes.size else 1
+    codes = np.empty(inX.shape[0], dtype=labelCodes.dtype)
+    _fusedClassify(np.ascontiguousarray(inX), np.ascontiguousarray(dataSet), labelCodes,
+                   min(k, dataSet.shape[0]), numClasses, weighted, float(a), float(b), codes)
+    return codes if classes is None else classes[codes]
+
+
+def checkConsistency(numSamples=300, numQueries=40, numFeatures=5, numClasses=3, ks=(1, 4, 15), seed=0):
+    """
+    比较核函数与 NumPy 实现的近邻和预测结果，不一致时抛出 AssertionError
+    未安装 numba 时核函数以纯 Python 执行，数据规模应较小
+    :return: True
+    """
+    rng = np.random.default_rng(seed)
+    dataSet = rng.random((numSamples, numFeatures))
+    queries = rng.random((numQueries, numFeatures))
+    labelCodes = rng.integers(0, numClasses, numSamples).astype(np.uint8)
+    for k in ks:
+        distances, indices = kNeighbors(queries, dataSet, k)
+        fusedDistances, fusedIndices = kNeighborsFused(queries, dataSet, k, useJit=True)
+        if not (np.array_equal(indices, fusedIndices) and np.allclose(distances, fusedDistances)):
+            raise AssertionError("neighbours differ for k = %d" % k)
+        for weighted in (False, True):
+            expected = voteLabels(indices, distances, labelCodes, weighted, 2.0, 0.5)
+            fused = classifyFused(queries, dataSet, labelCodes, k, weighted, 2.0, 0.5, useJit=True)
+            if not np.array_equal(expected, fused):
+                raise AssertionError("predictions differ for k = %d, weighted = %s" % (k, weighted))
+    return True
+
+
+if __name__ == '__main__':
+    print("numba available: {:}".format(HAVE_NUMBA))
+    print("fused kernels consistent with NumPy: {:}".format(checkConsistency()))
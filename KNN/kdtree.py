@@ -0,0 +1,149 @@
+# KD 树空间索引
+# 用归一化后的训练样本集一次性建树，之后每次查询只需访问少量叶子节点
+# 查询结果是精确的 k 近邻，与暴力搜索 kNeighbors 的结果一致
+
+import heapq
+import numpy as np
+
+
+class KDTree:
+    """
+    使用数组存储的 KD 树，每个节点按方差最大的维度在中位数处切分
+    """
+
+    def __init__(self, dataSet, leafSize=16):
+        """
+        :param dataSet: ndarray, (n, d) 归一化后的训练样本集
+        :param leafSize: 叶子节点最多包含的样本数
+        """
+        self.dataSet = np.asarray(dataSet)
+        self.leafSize = leafSize
+        self.indices = np.arange(self.dataSet.shape[0])
+        # 建树时只重排下标，不复制样本
+
+        self.splitDims = []
+        self.splitVals = []
+        self.children = []
+        self.bounds = []
+        # 每个节点的切分维度、切分值、左右子节点和在 indices 中的区间 [start, end)
+        self._build()
+
+        self.splitDims = np.array(self.splitDims, dtype=np.intp)
+        self.splitVals = np.array(self.splitVals, dtype=self.dataSet.dtype)
+        self.children = np.array(self.children, dtype=np.intp).reshape(-1, 2)
+        self.bounds = np.array(self.bounds, dtype=np.intp).reshape(-1, 2)
+
+    def _newNode(self, start, end):
+        self.splitDims.append(-1)
+        self.splitVals.append(0.0)
+        self.children.append((-1, -1))
+        self.bounds.append((start, end))
+        return len(self.bounds) - 1
+
+    def _build(self):
+        stack = [self._newNode(0, self.indices.size)]
+        # 使用栈代替递归，避免大数据集时递归过深
+        while stack:
+            node = stack.pop()
+            start, end = self.bounds[node]
+            if end - start <= self.leafSize:
+                continue
+            points = self.dataSet[self.indices[start:end]]
+            dim = int(points.var(axis=0).argmax())
+            if points[:, dim].max() == points[:, dim].min():
+                continue
+                # 所有样本完全相同，无法继续切分
+
+            mid = (end - start) // 2
+            order = np.argpartition(points[:, dim], mid)
+            self.indices[start:end] = self.indices[start:end][order]
+
+            self.splitDims[node] = dim
+            self.splitVals[node] = points[order[mid], dim]
+            left = self._newNode(start, start + mid)
+            right = self._newNode(start + mid, end)
+            self.children[node] = (left, right)
+            stack.extend((left, right))
+
+    def _queryOne(self, x, k, splitDims, splitVals, children):
+        heap = []
+        # 大小为 k 的最大堆，元素为 (-平方距离, -下标)，堆顶为当前第 k 近的邻居
+        worst = np.inf
+        # 第 k 近邻居的平方距离，堆未满时为无穷大
+        xList = x.tolist()
+        stack = [(0, 0.0, [0.0] * len(xList))]
+        # (节点, 查询点到该节点区域的最小平方距离, 查询点在各维度上到该区域的偏移)
+        while stack:
+            node, rdSq, offsets = stack.pop()
+            if rdSq > worst:
+                continue
+                # 剪枝：该节点不可能包含更近的邻居
+
+            dim = splitDims[node]
+            if dim < 0:
+                start, end = self.bounds[node]
+                leafIndices = self.indices[start:end]
+                sqDistances = ((self.dataSet[leafIndices] - x) ** 2).sum(axis=1)
+                closer = sqDistances <= worst
+                # 只有不比第 k 近邻居更远的样本才可能进入堆
+                for dist, index in zip(sqDistances[closer].tolist(), leafIndices[closer].tolist()):
+                    item = (-dist, -index)
+                    if len(heap) < k:
+                        heapq.heappush(heap, item)
+                    elif item > heap[0]:
+                        heapq.heapreplace(heap, item)
+                # 距离相同时保留下标较小的样本
+                if len(heap) == k:
+                    worst = -heap[0][0]
+                continue
+
+            diff = xList[dim] - splitVals[node]
+            near, far = children[node] if diff < 0 else children[node][::-1]
+            farOffsets = offsets.copy()
+            farOffsets[dim] = diff
+            stack.append((far, rdSq - offsets[dim] ** 2 + diff ** 2, farOffsets))
+            # 另一侧的最小距离只需替换切分维度上的偏移，其余维度的偏移累加不变
+            stack.append((near, rdSq, offsets))
+            # 先访问查询点所在的一侧
+
+        result = sorted((-negDist, -negIndex) for negDist, negIndex in heap)
+        return [dist ** 0.5 for dist, _ in result], [index for _, index in result]
+
+    def query(self, inX, k):
+        """
+        精确查找每个分类数据最近的 k 个邻居，按距离升序排列
+        :param inX: ndarray, (m, d) 分类数据
+        :param k: 选择最近邻居的数目
+        :return: distances, indices 均为 (m, k) 的 ndarray
+        """
+        inX = np.atleast_2d(inX)
+        k = min(k, self.dataSet.shape[0])
+        distances = np.empty((inX.shape[0], k))
+        indices = np.empty((inX.shape[0], k), dtype=np.intp)
+        nodes = self.splitDims.tolist(), self.splitVals.tolist(), self.children.tolist()
+        # 遍历时逐个访问节点，转换为列表比逐个索引 ndarray 快
+        for i, x in enumerate(inX):
+            distances[i], indices[i] = self._queryOne(x, k, *nodes)
+        return distances, indices
+
+    def getState(self):
+        """
+        :return: dict, 保存 KD 树所需的数组，不包含样本集本身
+        """
+        return {'indices': self.indices, 'splitDims': self.splitDims, 'splitVals': self.splitVals,
+                'children': self.children, 'bounds': self.bounds, 'leafSize': np.array(self.leafSize)}
+
+    @classmethod
+    def fromState(cls, dataSet, state):
+        """
+        由 getState 保存的数组恢复 KD 树，不需要重新建树
+        :param dataSet: ndarray, 建树时使用的样本集
+        :param state: dict, getState 的返回值
+        :return: KDTree
+        """
+        tree = cls.__new__(cls)
+        tree.dataSet = dataSet
+        tree.leafSize = int(state['leafSize'])
+        for name in ('indices', 'splitDims', 'splitVals', 'children', 'bounds'):
+            setattr(tree, name, state[name])
+        return tree
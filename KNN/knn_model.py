@@ -0,0 +1,128 @@
+# 可持久化的 KNN 模型
+# fit 时完成归一化、标签编码和索引构建，save 后以 .npy 文件保存在一个目录中
+# load 时用内存映射读入，预测进程无需重新解析和归一化训练数据
+
+import json
+import os
+import numpy as np
+
+from kdtree import KDTree
+from myKNN import autoNorm, buildIndex, classifyBatch, encodeLabels
+from projection import Projection, fitProjection
+from rpforest import RPForest
+
+INDEX_TYPES = {'KDTree': KDTree, 'RPForest': RPForest}
+
+
+class KNNModel:
+    """
+    保存归一化后的训练样本集、归一化参数 minVals/ranges、可选的降维投影、编码后的标签和近邻索引
+    使用投影时 dataSet 为投影后的训练样本集
+    """
+
+    def __init__(self, dataSet, minVals, ranges, labelCodes, classes, index=None, headers=None, projection=None):
+        self.dataSet = dataSet
+        self.minVals = minVals
+        self.ranges = ranges
+        self.projection = projection
+        self.labelCodes = labelCodes
+        self.classes = classes
+        self.index = index
+        self.headers = headers
+        self.version = 0
+        # 修改训练数据或归一化参数后加 1，使 QueryCache 中的缓存失效
+
+    @classmethod
+    def fit(cls, dataSet, labels, method='auto', headers=None, dtype=float, projection=None, numComponents=None,
+            varianceRatio=0.95, seed=None, **indexArgs):
+        """
+        :param dataSet: ndarray, (n, d) 未归一化的训练样本集
+        :param labels: list, 样本集对应的标签
+        :param method: 近邻搜索方式，见 buildIndex
+        :param headers: list, 表头
+        :param dtype: 特征的数据类型，可选 np.float32
+        :param projection: 降维方式，None 不降维，'pca' 或 'random'，见 fitProjection
+        :param numComponents: 投影后的维度
+        :param varianceRatio: PCA 且 numComponents 为 None 时保留的方差比例
+        :param seed: 随机种子，用于随机投影和随机投影森林
+        :param indexArgs: 传给索引构造函数的参数
+        :return: KNNModel
+        """
+        normDataSet, minVals, ranges = autoNorm(np.asarray(dataSet, dtype=dtype))
+        if projection is not None:
+            projection = fitProjection(normDataSet, projection, numComponents, varianceRatio, seed)
+            normDataSet = projection.transform(normDataSet)
+            # 索引建立在投影后的样本上
+        labelCodes, classes = encodeLabels(labels)
+        if method == 'rpforest':
+            indexArgs['seed'] = seed
+            # 只有随机投影森林接受随机种子
+        index = buildIndex(normDataSet, method, **indexArgs)
+        return cls(normDataSet, minVals, ranges, labelCodes, classes, index, headers, projection)
+
+    def normalize(self, inX):
+        """
+        使用训练集的参数对分类数据进行归一化，有投影时同时进行投影
+        """
+        normX = (np.atleast_2d(inX) - self.minVals) / self.ranges
+        if self.projection is not None:
+            normX = self.projection.transform(normX)
+        return normX.astype(self.dataSet.dtype, copy=False)
+
+    def predict(self, inX, k, weighted=False):
+        """
+        :param inX: ndarray, (m, d) 未归一化的分类数据
+        :param k: 选择最近邻居的数目
+        :param weighted: 是否使用距离权值优化
+        :return: ndarray, (m,) 预测的标签
+        """
+        codes = classifyBatch(self.normalize(inX), self.dataSet, self.labelCodes, k, weighted, self.index)
+        return self.classes[codes]
+
+    def save(self, path):
+        """
+        保存到目录 path，每个数组一个 .npy 文件
+        """
+        os.makedirs(path, exist_ok=True)
+        arrays = {'dataSet': self.dataSet, 'minVals': self.minVals, 'ranges': self.ranges,
+                  'labelCodes': self.labelCodes}
+        meta = {'classes': self.classes.tolist(), 'headers': self.headers, 'index': None, 'projection': None}
+        if self.projection is not None:
+            meta['projection'] = self.projection.method
+            for name, array in self.projection.getState().items():
+                arrays['projection.' + name] = array
+        if self.index is not None:
+            meta['index'] = type(self.index).__name__
+            for name, array in self.index.getState().items():
+                arrays['index.' + name] = array
+        for name, array in arrays.items():
+            np.save(os.path.join(path, name + '.npy'), array)
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as file:
+            json.dump(meta, file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        :param path: save 保存的目录
+        :param mmap: True 时以只读方式映射数组文件，不复制数据
+        :return: KNNModel
+        """
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as file:
+            meta = json.load(file)
+        mmapMode = 'r' if mmap else None
+        arrays = {}
+        for fileName in os.listdir(path):
+            if fileName.endswith('.npy'):
+                arrays[fileName[:-len('.npy')]] = np.load(os.path.join(path, fileName), mmap_mode=mmapMode)
+
+        index = None
+        if meta['index'] is not None:
+            state = {name[len('index.'):]: array for name, array in arrays.items() if name.startswith('index.')}
+            index = INDEX_TYPES[meta['index']].fromState(arrays['dataSet'], state)
+        projection = None
+        if meta.get('projection') is not None:
+            state = {name[len('projection.'):]: array for name, array in arrays.items()
+                     if name.startswith('projection.')}
+            projection = Projection.fromState(meta['projection'], state)
+        return cls(arrays['dataSet'], arrays['minVals'], arrays['ranges'], arrays['labelCodes'],
+                   np.array(meta['classes']), index, meta['headers'], projection)
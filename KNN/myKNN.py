@@ -7,9 +7,20 @@
 # 和一个标签：species
 
 import csv
+import os
 import numpy as np
-import operator
 import random
+import time
+from math import isqrt
+
+from instrument import phase
+
+KDTREE_MAX_DIM = 6
+KDTREE_MIN_SAMPLES = 1000
+# auto 模式下维度不超过 KDTREE_MAX_DIM 且样本数不少于 KDTREE_MIN_SAMPLES * 2^d 时才使用 KD 树
+# 维度更高时剪枝基本失效，样本更少时批量暴力搜索更快(实测 d=4 时在 1 万到 3 万样本之间交叉)
+MEMORY_BUDGET = 256 << 20
+# 暴力搜索时距离矩阵及临时数组最多占用的字节数，超过时分块计算
 
 
 # 构建 KNN 分类器
@@ -33,14 +44,9 @@ def classify0(inX, dataSet, labels, k):
     # 计算距离
     sortedDistIndicies = distances.argsort()
     # argsort() 返回将数组值升序排序后的索引值
-    classCount = {}
-    for i in range(k):
-        voteIlabel = labels[sortedDistIndicies[i]]
-        classCount[voteIlabel] = classCount.get(voteIlabel, 0) + 1
-    # 使用字典统计标签出现的频率
-    sortedClassCount = sorted(classCount.items(), key=operator.itemgetter(1), reverse=True)
-    # 按照出现频率逆序排列，返回频率最高的类标签
-    return sortedClassCount[0][0]
+    nearest = sortedDistIndicies[np.newaxis, :k]
+    return voteLabels(nearest, distances[nearest], labels)[0]
+    # 统计前 k 个邻居的标签，返回频率最高的类标签
 
 
 # TODO: 距离权值优化
@@ -67,37 +73,311 @@ def classify1(inX, dataSet, labels, k):
     # 计算距离
     sortedDistIndicies = distances.argsort()
     # argsort() 返回将数组值升序排序后的索引值
-    classCount = {}
-    for i in range(k):
-        voteIlabel = labels[sortedDistIndicies[i]]
-        classCount[voteIlabel] = classCount.get(voteIlabel, 0) + f(distances[sortedDistIndicies[i]])
-        # classCount 加上加权距离
-    # 使用字典统计标签出现的频率
-    sortedClassCount = sorted(classCount.items(), key=operator.itemgetter(1), reverse=True)
-    # 按照出现频率逆序排列，返回频率最高的类标签
-    return sortedClassCount[0][0]
+    nearest = sortedDistIndicies[np.newaxis, :k]
+    return voteLabels(nearest, distances[nearest], labels, weighted=True)[0]
+    # 每个邻居的票数为加权距离，返回票数最高的类标签
+
+
+# 批量计算距离矩阵
+def pairwiseDistances(inX, dataSet):
+    """
+    利用 ||a||² - 2a·b + ||b||² 的矩阵形式计算分类集与样本集之间的欧氏距离
+    :param inX: ndarray, (m, d) 分类数据
+    :param dataSet: ndarray, (n, d) 训练样本集
+    :return: ndarray, (m, n) 距离矩阵
+    """
+    sqInX = (inX ** 2).sum(axis=1)[:, np.newaxis]
+    sqDataSet = (dataSet ** 2).sum(axis=1)[np.newaxis, :]
+    sqDistances = sqInX - 2 * inX @ dataSet.T + sqDataSet
+    np.maximum(sqDistances, 0, out=sqDistances)
+    # 浮点误差可能产生极小的负数，截断为 0 后再开方
+    return np.sqrt(sqDistances, out=sqDistances)
+
+
+# 从距离矩阵中选出每行最近的 k 个
+def topK(distances, k):
+    """
+    :param distances: ndarray, (m, n) 距离矩阵
+    :param k: 选择最近邻居的数目，不超过 n
+    :return: distances, indices 均为 (m, k) 的 ndarray，按距离升序排列
+    """
+    rows = np.arange(distances.shape[0])[:, np.newaxis]
+    if k < distances.shape[1]:
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        # argpartition 只保证前 k 个是最小的，不保证顺序
+    else:
+        nearest = np.broadcast_to(np.arange(k), distances.shape)
+    order = np.argsort(distances[rows, nearest], axis=1, kind='stable')
+    # 只对这 k 个邻居排序
+    nearest = nearest[rows, order]
+    return distances[rows, nearest], nearest
+
+
+# 批量查找最近邻
+def kNeighbors(inX, dataSet, k, memoryBudget=MEMORY_BUDGET, workers=None):
+    """
+    返回每个分类数据最近的 k 个邻居，按距离升序排列
+    距离矩阵超过 memoryBudget 时，将分类集和样本集切分成小块，逐块计算并维护每个分类数据当前的 k 近邻，
+    分类集的各块在线程池中并行计算(NumPy 在矩阵乘法时释放 GIL)
+    :param inX: ndarray, (m, d) 分类数据
+    :param dataSet: ndarray, (n, d) 训练样本集
+    :param k: 选择最近邻居的数目
+    :param memoryBudget: 距离计算最多占用的字节数
+    :param workers: 线程数，None 表示分块时使用全部 CPU
+    :return: distances, indices 均为 (m, k) 的 ndarray
+    """
+    m, n = inX.shape[0], dataSet.shape[0]
+    k = min(k, n)
+    itemSize = np.result_type(inX, dataSet).itemsize
+    if m * n * itemSize * 2 <= memoryBudget and workers is None:
+        return topK(pairwiseDistances(inX, dataSet), k)
+
+    workers = workers or os.cpu_count() or 1
+    tileElems = max(memoryBudget // (itemSize * 3 * workers), 1)
+    # 每个线程同时持有距离块和两份同样大小的临时数组
+    if tileElems // n >= 64:
+        queryTile = min(m, tileElems // n)
+    else:
+        queryTile = min(m, max(isqrt(tileElems), 1))
+    trainTile = min(n, max(k, tileElems // queryTile))
+
+    distances = np.empty((m, k), dtype=np.result_type(inX, dataSet, np.float32))
+    indices = np.empty((m, k), dtype=np.intp)
+
+    def searchTile(start):
+        queries = inX[start:start + queryTile]
+        bestDistances, bestIndices = None, None
+        for trainStart in range(0, n, trainTile):
+            tileDistances, tileIndices = topK(
+                pairwiseDistances(queries, dataSet[trainStart:trainStart + trainTile]),
+                min(k, n - trainStart))
+            tileIndices += trainStart
+            if bestDistances is None:
+                bestDistances, bestIndices = tileDistances, tileIndices
+            else:
+                bestDistances, bestIndices = mergeNeighbors([bestDistances, tileDistances],
+                                                            [bestIndices, tileIndices], k)
+        distances[start:start + queryTile] = bestDistances
+        indices[start:start + queryTile] = bestIndices
+
+    starts = range(0, m, queryTile)
+    if workers == 1 or len(starts) == 1:
+        for start in starts:
+            searchTile(start)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(searchTile, starts))
+            # list() 使线程中的异常在这里抛出
+    return distances, indices
+
+
+# 合并多个部分的近邻结果
+def mergeNeighbors(distancesList, indicesList, k):
+    """
+    将样本集不同部分各自的近邻结果合并为全局的 k 近邻，下标需事先换算为全局下标
+    :param distancesList: list, 每部分 (m, ki) 的距离
+    :param indicesList: list, 每部分 (m, ki) 的全局下标
+    :param k: 选择最近邻居的数目
+    :return: distances, indices 均为 (m, k) 的 ndarray
+    """
+    distances = np.concatenate(distancesList, axis=1)
+    indices = np.concatenate(indicesList, axis=1)
+    order = np.lexsort((indices, distances), axis=1)[:, :k]
+    # 距离相同时取下标较小的样本
+    rows = np.arange(distances.shape[0])[:, np.newaxis]
+    return distances[rows, order], indices[rows, order]
+
+
+# 标签编码
+def encodeLabels(labels):
+    """
+    将标签编码为紧凑的整数数组，只需在读入数据后执行一次
+    :param labels: list, 样本集对应的标签
+    :return: labelCodes, classes; classes[labelCodes] 还原为原标签
+    """
+    classes, labelCodes = np.unique(np.asarray(labels), return_inverse=True)
+    return labelCodes.astype(np.min_scalar_type(max(classes.size - 1, 0))), classes
+
+
+# 批量投票
+def voteLabels(indices, distances, labels, weighted=False, a=1.0, b=1.0):
+    """
+    根据最近邻居的标签进行投票，票数相同时取排名最靠前的邻居的标签，与原先的字典计数一致
+    :param indices: ndarray, (m, k) 最近邻居的下标
+    :param distances: ndarray, (m, k) 最近邻居的距离
+    :param labels: encodeLabels 编码后的整数数组，或原始的标签列表
+    :param weighted: 是否使用距离权值 f
+    :param a, b: 距离权值 f 的参数
+    :return: ndarray, (m,) 预测的标签，与 labels 的形式相同
+    """
+    if isinstance(labels, np.ndarray) and labels.dtype.kind in 'iu':
+        labelCodes, classes = labels, None
+    else:
+        flatIndices = indices.ravel()
+        if isinstance(labels, np.ndarray):
+            neighborLabels = labels[flatIndices]
+        else:
+            neighborLabels = [labels[i] for i in flatIndices.tolist()]
+        labelCodes, classes = encodeLabels(neighborLabels)
+        indices = np.arange(flatIndices.size).reshape(indices.shape)
+        # 只编码 m * k 个邻居的标签，不必每次处理整个样本集的标签
+    numClasses = int(labelCodes.max()) + 1 if labelCodes.size else 1
+    neighborCodes = labelCodes[indices].astype(np.intp)
+    m, k = indices.shape
+    rows = np.arange(m)[:, np.newaxis]
+
+    votes = f(distances, a, b).ravel() if weighted else None
+    classCount = np.bincount((rows * numClasses + neighborCodes).ravel(), weights=votes,
+                             minlength=m * numClasses).reshape(m, numClasses)
+    # 统计每个类标签的票数
+
+    isBest = classCount[rows, neighborCodes] == classCount.max(axis=1, keepdims=True)
+    codes = neighborCodes[rows[:, 0], isBest.argmax(axis=1)]
+    # 票数相同时取排名最靠前的邻居所属的类
+    return codes if classes is None else classes[codes]
+
+
+# 构建空间索引
+def buildIndex(dataSet, method='auto', **indexArgs):
+    """
+    由归一化后的训练样本集构建一次索引，供 classifyBatch 重复使用
+    :param dataSet: ndarray, (n, d) 训练样本集
+    :param method: 'kdtree' 使用 KD 树，'rpforest' 使用随机投影森林(近似)，
+                   'brute' 使用暴力搜索，'auto' 根据维度和样本数在 KD 树和暴力搜索之间选择
+    :param indexArgs: 传给索引构造函数的参数，如 leafSize, numTrees, searchK, seed
+    :return: KDTree 或 RPForest，暴力搜索时返回 None
+    """
+    if method == 'auto':
+        numSamples, numFeatures = dataSet.shape
+        useTree = numFeatures <= KDTREE_MAX_DIM and numSamples >= KDTREE_MIN_SAMPLES << numFeatures
+        method = 'kdtree' if useTree else 'brute'
+    if method == 'kdtree':
+        from kdtree import KDTree
+        return KDTree(dataSet, **indexArgs)
+    if method == 'rpforest':
+        from rpforest import RPForest
+        return RPForest(dataSet, **indexArgs)
+    if method == 'brute':
+        return None
+    raise ValueError("unknown index method: %s" % method)
+
+
+# 近似最近邻的召回率
+def measureRecall(index, dataSet, queries, k, exactIndices=None):
+    """
+    以暴力搜索的结果为准，计算索引找到的 k 近邻所占的比例
+    :param index: buildIndex 返回的索引
+    :param dataSet: ndarray, (n, d) 建立索引所用的训练样本集
+    :param queries: ndarray, (m, d) 留出的查询数据
+    :param k: 选择最近邻居的数目
+    :param exactIndices: ndarray, (m, k) 已经算好的精确 k 近邻，None 时使用 kNeighbors 计算
+    :return: 平均召回率
+    """
+    if exactIndices is None:
+        _, exactIndices = kNeighbors(queries, dataSet, k)
+    _, approxIndices = index.query(queries, k)
+    found = (approxIndices[:, :, np.newaxis] == exactIndices[:, np.newaxis, :]).any(axis=2)
+    return found.mean()
+
+
+def recallReport(dataSet, k, numTreesList=(1, 5, 10, 20), searchKList=(None,), testRatio=0.2, seed=None):
+    """
+    留出部分数据作为查询集，对每组 numTrees/searchK 参数输出召回率和查询耗时，用于选择近似搜索的参数
+    :param dataSet: ndarray, (n, d) 归一化后的样本集
+    :param k: 选择最近邻居的数目
+    :param numTreesList: 需要测试的树的数目
+    :param searchKList: 需要测试的候选样本数，None 表示使用默认值
+    :param testRatio: 查询集所占比例
+    :param seed: 随机种子
+    :return: list, 每组参数的 (numTrees, searchK, recall, 每个查询的平均耗时/秒)
+    """
+    from rpforest import RPForest
+
+    indices = np.random.default_rng(seed).permutation(dataSet.shape[0])
+    numTest = int(dataSet.shape[0] * testRatio)
+    queries, trainSet = dataSet[indices[:numTest]], dataSet[indices[numTest:]]
+
+    start = time.perf_counter()
+    _, exactIndices = kNeighbors(queries, trainSet, k)
+    print("exact search: {:.3g} s/query".format((time.perf_counter() - start) / numTest))
+
+    results = []
+    for numTrees in numTreesList:
+        forest = RPForest(trainSet, numTrees=numTrees, seed=seed)
+        for searchK in searchKList:
+            forest.searchK = searchK if searchK is not None else numTrees * forest.leafSize
+            start = time.perf_counter()
+            forest.query(queries, k)
+            elapsed = (time.perf_counter() - start) / numTest
+            recall = measureRecall(forest, trainSet, queries, k, exactIndices)
+            results.append((numTrees, forest.searchK, recall, elapsed))
+            print("numTrees = {:}, searchK = {:}, recall = {:.2%}, {:.3g} s/query".format(
+                numTrees, forest.searchK, recall, elapsed))
+    return results
+
+
+def classifyBatch(inX, dataSet, labels, k, weighted=False, index=None, jit=False):
+    """
+    批量分类器，一次调用返回整个分类集的预测结果
+    :param inX: ndarray, (m, d) 分类数据
+    :param dataSet: ndarray, (n, d) 训练样本集
+    :param labels: list, 样本集对应的标签
+    :param k: 选择最近邻居的数目
+    :param weighted: False 等价于 classify0，True 等价于 classify1
+    :param index: buildIndex 返回的索引，None 表示暴力搜索
+    :param jit: 暴力搜索时使用 jit_kernels 中融合的编译核函数，未安装 numba 时仍使用 NumPy
+    :return: ndarray, (m,) 预测的标签
+    """
+    if index is None and jit:
+        from jit_kernels import classifyFused
+        return classifyFused(inX, dataSet, labels, k, weighted)
+    if index is None:
+        distances, indices = kNeighbors(np.atleast_2d(inX), dataSet, k)
+    else:
+        distances, indices = index.query(inX, k)
+    return voteLabels(indices, distances, labels, weighted)
 
 # 加载数据
-def file2matrix(filename):
+def file2matrix(filename, dtype=float):
     """
+    CSV 文件分块解析到预先分配的数组中；.npy 文件为 dataset_io.csvToBinary 转换的二进制数据集，直接内存映射
     :param filename:
+    :param dtype: 特征的数据类型，可选 np.float32 以减少一半内存
     :return: dataSet, labels, headers
     """
-    with open(filename, newline='') as csvfile:
-        csvreader = csv.reader(csvfile, delimiter=',')
-        data = list(csvreader)
+    from dataset_io import loadBinary, loadCsv
 
-        headers = data[0]
-        data = data[1:]  # 去除数据的表头部分
+    if filename.endswith('.npy'):
+        dataSet, labels, headers = loadBinary(filename)
+        if dataSet.dtype != dtype:
+            dataSet = dataSet.astype(dtype)
+        return dataSet, labels, headers
+    return loadCsv(filename, dtype=dtype)
+
+
+# 加载数据并编码标签
+def file2codes(filename, dtype=float):
+    """
+    与 file2matrix 相同，但返回 encodeLabels 编码后的标签
+    .npy 文件直接使用保存的标签编码，不生成每行的标签字符串
+    :param filename:
+    :param dtype: 特征的数据类型
+    :return: dataSet, labelCodes, classes, headers
+    """
+    if not filename.endswith('.npy'):
+        dataSet, labels, headers = file2matrix(filename, dtype)
+        labelCodes, classes = encodeLabels(labels)
+        return dataSet, labelCodes, classes, headers
 
-        # dataSet = np.array(data[1:][:4])  # 创建 ndarray 对象存储特征值
-        dataSet = np.array([row[:-1] for row in data], dtype=float)
-        # 这里需要指定dtype，否则函数自动推断类型会有误
-        labels = [row[-1] for row in data]
-        # labels = list(data[1:][4])  # 创建存放标签的列表
-        # headers = list(data[0][:4])  # 创建存放表头的列表
+    from dataset_io import loadBinaryCodes
 
-    return dataSet, labels, headers
+    dataSet, labelCodes, classes, headers = loadBinaryCodes(filename)
+    if dataSet.dtype != dtype:
+        dataSet = dataSet.astype(dtype)
+    labelCodes = labelCodes.astype(np.min_scalar_type(max(len(classes) - 1, 0)))
+    # 与 encodeLabels 一样使用最小的整数类型
+    return dataSet, labelCodes, np.array(classes), headers
 
 
 # 数据预处理 MinMax归一化
@@ -111,22 +391,29 @@ def autoNorm(dataSet):
     return normDataSet, minVals, ranges
 
 # 数据集划分
-def dataSetSplit(dataSet, labels, testRatio=0.2):
+def dataSetSplit(dataSet, labels, testRatio=0.2, rng=None):
     """
     使用索引随机排序来重新排列 dataSet 和 labels，并划分数据集
     :param dataSet: ndarray, 包含所有样本的特征数据
-    :param labels: list, 每个样本对应的标签
+    :param labels: list 或 ndarray, 每个样本对应的标签
     :param testRatio:
+    :param rng: np.random.Generator, 用于复现划分，None 时使用 random 模块
     :return: xTrain, yTrain, xTest, yTest
     """
     dataSize = dataSet.shape[0]  # 获取数据集长度
 
-    indices = list(range(dataSize))
-    random.shuffle(indices)
+    if rng is None:
+        indices = list(range(dataSize))
+        random.shuffle(indices)
+    else:
+        indices = rng.permutation(dataSize).tolist()
     # 创建一个随机排列
 
     shuffledDataSet = dataSet[indices]
-    shuffledLabels = [labels[i] for i in indices]
+    if isinstance(labels, np.ndarray):
+        shuffledLabels = labels[indices]
+    else:
+        shuffledLabels = [labels[i] for i in indices]
     # 随机排列 dataSet 和 labels
 
     numTest = int(dataSize * testRatio)
@@ -139,21 +426,22 @@ def dataSetSplit(dataSet, labels, testRatio=0.2):
 
 # TODO 单次测试分类器
 
-def Test0(dataSet, labels, testRatio=0.2):
+def Test0(dataSet, labels, k, testRatio=0.2, trial=None):
     '''
     随机划分测试集和训练集，返回错误个数和错误率
     :param dataSet:
     :param labels:
+    :param k:
     :param testRatio:
+    :param trial: 第几次测试，记录在阶段信息中
     :return: errorCount, errorRate
     '''
-    xTrain, yTrain, xTest, yTest = dataSetSplit(dataSet, labels, testRatio)
+    with phase('dataSetSplit', trial=trial):
+        xTrain, yTrain, xTest, yTest = dataSetSplit(dataSet, labels, testRatio)
 
-    errorCount = 0
-    for x, y in zip(xTest, yTest):
-        yForecast = classify0(x, xTrain, yTrain, k)
-        errorCount += yForecast != y
-        # print("The classifier came back with %s, the real answer is: %s" % (yForecast, y))
+    with phase('classify', trial=trial, k=k, weighted=False, numTest=len(yTest)):
+        yForecast = classifyBatch(xTest, xTrain, yTrain, k, weighted=False)
+    errorCount = int((yForecast != np.asarray(yTest)).sum())
 
     numTest = int(dataSet.shape[0] * testRatio)
     # print("numTest is", numTest)
@@ -163,21 +451,22 @@ def Test0(dataSet, labels, testRatio=0.2):
 
 
 # TODO 单次测试分类器，加权距离优化
-def Test1(dataSet, labels, testRatio=0.2):
+def Test1(dataSet, labels, k, testRatio=0.2, trial=None):
     '''
     随机划分测试集和训练集，返回错误个数和错误率
     :param dataSet:
     :param labels:
+    :param k:
     :param testRatio:
+    :param trial: 第几次测试，记录在阶段信息中
     :return: errorCount, errorRate
     '''
-    xTrain, yTrain, xTest, yTest = dataSetSplit(dataSet, labels, testRatio)
+    with phase('dataSetSplit', trial=trial):
+        xTrain, yTrain, xTest, yTest = dataSetSplit(dataSet, labels, testRatio)
 
-    errorCount = 0
-    for x, y in zip(xTest, yTest):
-        yForecast = classify1(x, xTrain, yTrain, k)
-        errorCount += yForecast != y
-        # print("The classifier came back with %s, the real answer is: %s" % (yForecast, y))
+    with phase('classify', trial=trial, k=k, weighted=True, numTest=len(yTest)):
+        yForecast = classifyBatch(xTest, xTrain, yTrain, k, weighted=True)
+    errorCount = int((yForecast != np.asarray(yTest)).sum())
 
     numTest = int(dataSet.shape[0] * testRatio)
     # print("numTest is", numTest)
@@ -186,26 +475,40 @@ def Test1(dataSet, labels, testRatio=0.2):
     return errorCount, errorCount / float(numTest)
 
 # 测试普通分类器性能
-def KNNTest0(filename, k, testRatio=0.2, testTimes = 10):
+def KNNTest0(filename, k, testRatio=0.2, testTimes = 10, workers=None, seed=None):
     """
     首先读入数据，进行标准化；
     然后进行10次随机划分测试，输出每次错误个数和错误率；
     最后输出总错误个数以及平均错误率；
     :param filename:
     :param k:
+    :param workers: 大于 0 时使用 parallel_eval 在进程池中并行测试，None 表示串行
+    :param seed: 随机种子，串行和并行测试使用相同的划分，结果相同
     :return:
     """
 
     print("\nTest the classifier performance on " + filename)
     print("parameter: k = {:}, test ratio = {:}".format(k, testRatio))
 
-    dataSet, labels, headers = file2matrix(filename)
-    normdataSet, minVals, ranges = autoNorm(dataSet)
+    with phase('file2matrix', filename=filename):
+        dataSet, labels, classes, headers = file2codes(filename)
+        # 标签只编码一次，之后以整数数组传递
+    with phase('autoNorm'):
+        normdataSet, minVals, ranges = autoNorm(dataSet)
+
+    from parallel_eval import parallelTrials, runTrial
+    with phase('trials', k=k, testTimes=testTimes, workers=workers):
+        if workers:
+            trials = parallelTrials(normdataSet, labels, k, testRatio, testTimes, workers, seed)
+        else:
+            trials = [runTrial(normdataSet, labels, k, testRatio, trialSeed, trial)
+                      for trial, trialSeed in enumerate(np.random.SeedSequence(seed).spawn(testTimes))]
+        trials = [trial[0] for trial in trials]
+        # runTrial 同时测试两种分类器，这里只取普通分类器的结果
 
     totalErrorCount = 0
     averageErrorRate = 0.0
-    for _ in range(0, testTimes):
-        errorCount, errorRate = Test0(normdataSet, labels, testRatio)
+    for errorCount, errorRate in trials:
 
         # print("The {:}th error number is: {:}, error rate is: {:.2%}".format(_ + 1, errorCount, errorRate))
 
@@ -217,26 +520,40 @@ def KNNTest0(filename, k, testRatio=0.2, testTimes = 10):
 
 
 # 测试加权优化分类器性能
-def KNNTest1(filename, k, testRatio=0.2, testTimes = 10):
+def KNNTest1(filename, k, testRatio=0.2, testTimes = 10, workers=None, seed=None):
     """
     首先读入数据，进行标准化；
     然后进行10次随机划分测试，输出每次错误个数和错误率；
     最后输出总错误个数以及平均错误率；
     :param filename:
     :param k:
+    :param workers: 大于 0 时使用 parallel_eval 在进程池中并行测试，None 表示串行
+    :param seed: 随机种子，串行和并行测试使用相同的划分，结果相同
     :return:
     """
 
     print("\nTest the classifier performance on " + filename + " with optimization")
     print("parameter: k = {:}, test ratio = {:}".format(k, testRatio))
 
-    dataSet, labels, headers = file2matrix(filename)
-    normdataSet, minVals, ranges = autoNorm(dataSet)
+    with phase('file2matrix', filename=filename):
+        dataSet, labels, classes, headers = file2codes(filename)
+        # 标签只编码一次，之后以整数数组传递
+    with phase('autoNorm'):
+        normdataSet, minVals, ranges = autoNorm(dataSet)
+
+    from parallel_eval import parallelTrials, runTrial
+    with phase('trials', k=k, testTimes=testTimes, workers=workers):
+        if workers:
+            trials = parallelTrials(normdataSet, labels, k, testRatio, testTimes, workers, seed)
+        else:
+            trials = [runTrial(normdataSet, labels, k, testRatio, trialSeed, trial)
+                      for trial, trialSeed in enumerate(np.random.SeedSequence(seed).spawn(testTimes))]
+        trials = [trial[1] for trial in trials]
+        # runTrial 同时测试两种分类器，这里只取加权优化分类器的结果
 
     totalErrorCount = 0
     averageErrorRate = 0.0
-    for _ in range(0, testTimes):
-        errorCount, errorRate = Test1(normdataSet, labels, testRatio)
+    for errorCount, errorRate in trials:
 
         # print("The {:}th error number is: {:}, error rate is: {:.2%}".format(_ + 1, errorCount, errorRate))
 
@@ -248,7 +565,7 @@ def KNNTest1(filename, k, testRatio=0.2, testTimes = 10):
 
 # 对比普通分类器和加权距离优化分类器性能
 # TODO 测试加权优化分类器性能
-def KNNTest01(filename, k, testRatio=0.2, testTimes = 10):
+def KNNTest01(filename, k, testRatio=0.2, testTimes = 10, workers=None, seed=None):
     """
     使用相同的数据集划分对两种分类器进行性能测试，并进行对比
     首先读入数据，进行标准化；
@@ -256,45 +573,114 @@ def KNNTest01(filename, k, testRatio=0.2, testTimes = 10):
     最后输出总错误个数以及平均错误率；
     :param filename:
     :param k:
+    :param workers: 大于 0 时使用 parallel_eval 在进程池中并行测试，None 表示串行
+    :param seed: 随机种子，串行和并行测试使用相同的划分，结果相同
     :return:
     """
 
     print("\n With parameter: k = {:}, test ratio = {:}".format(k, testRatio))
 
-    dataSet, labels, headers = file2matrix(filename)
-    normdataSet, minVals, ranges = autoNorm(dataSet)
+    with phase('file2matrix', filename=filename):
+        dataSet, labels, classes, headers = file2codes(filename)
+        # 标签只编码一次，之后以整数数组传递
+    with phase('autoNorm'):
+        normdataSet, minVals, ranges = autoNorm(dataSet)
+
+    from parallel_eval import parallelTrials, runTrial
+    with phase('trials', k=k, testTimes=testTimes, workers=workers):
+        if workers:
+            trials = parallelTrials(normdataSet, labels, k, testRatio, testTimes, workers, seed)
+        else:
+            trials = [runTrial(normdataSet, labels, k, testRatio, trialSeed, trial)
+                      for trial, trialSeed in enumerate(np.random.SeedSequence(seed).spawn(testTimes))]
+        # 每次划分只计算一次近邻排序，两种分类器在同一份排序上投票
 
     totalErrorCount0 = 0
     averageErrorRate0 = 0.0
     totalErrorCount1 = 0
     averageErrorRate1 = 0.0
-    for _ in range(0, testTimes):
+    for (errorCount0, errorRate0), (errorCount1, errorRate1) in trials:
 
-        errorCount, errorRate = Test0(normdataSet, labels, testRatio)
-        totalErrorCount0 += errorCount
-        averageErrorRate0 += errorRate / float(testTimes)
+        totalErrorCount0 += errorCount0
+        averageErrorRate0 += errorRate0 / float(testTimes)
 
-        errorCount, errorRate = Test0(normdataSet, labels, testRatio)
-        totalErrorCount1 += errorCount
-        averageErrorRate1 += errorRate / float(testTimes)
+        totalErrorCount1 += errorCount1
+        averageErrorRate1 += errorRate1 / float(testTimes)
 
     print("The total error times of general classifier is: {:}, of optimized classifier is: {:}".format(totalErrorCount0, totalErrorCount1))
     print("The average error rate of general classifier is: {:.2%}, of optimized classifier is: {:.2%}".format(averageErrorRate0, averageErrorRate1))
 
+
+# 对比不同 k 值下两种分类器的性能
+def KNNSweep(filename, ks, testRatio=0.2, testTimes=10):
+    """
+    模型选择：只读入和标准化一次数据；
+    每次随机划分只计算一次距离，得到前 max(ks) 个邻居的排序；
+    再用这份排序对每个 k 值分别统计普通分类器和加权优化分类器的错误；
+    最后按 KNNTest01 的格式输出每个 k 值的总错误个数以及平均错误率；
+    :param filename:
+    :param ks: 需要测试的 k 值
+    :param testRatio:
+    :param testTimes:
+    :return: dict, k -> (totalErrorCount0, averageErrorRate0, totalErrorCount1, averageErrorRate1)
+    """
+    ks = list(ks)
+    with phase('file2matrix', filename=filename):
+        dataSet, labels, classes, headers = file2codes(filename)
+        # 标签只编码一次，之后以整数数组传递
+    with phase('autoNorm'):
+        normdataSet, minVals, ranges = autoNorm(dataSet)
+
+    totalErrorCount = np.zeros((len(ks), 2), dtype=int)
+    # 第 0 列为普通分类器，第 1 列为加权优化分类器
+    averageErrorRate = np.zeros((len(ks), 2))
+    for trial in range(0, testTimes):
+        with phase('dataSetSplit', trial=trial):
+            xTrain, yTrain, xTest, yTest = dataSetSplit(normdataSet, labels, testRatio)
+        with phase('kNeighbors', trial=trial, k=max(ks)):
+            distances, indices = kNeighbors(xTest, xTrain, max(ks))
+            # 一次划分只计算一次距离和排序，前 k 列就是 k 个最近邻居
+        yTest = np.asarray(yTest)
+
+        for i, k in enumerate(ks):
+            for j, weighted in enumerate((False, True)):
+                with phase('voteLabels', trial=trial, k=k, weighted=weighted):
+                    yForecast = voteLabels(indices[:, :k], distances[:, :k], yTrain, weighted)
+                errorCount = int((yForecast != yTest).sum())
+                totalErrorCount[i, j] += errorCount
+                averageErrorRate[i, j] += errorCount / float(len(yTest)) / float(testTimes)
+
+    results = {}
+    for i, k in enumerate(ks):
+        print("\n With parameter: k = {:}, test ratio = {:}".format(k, testRatio))
+        print("The total error times of general classifier is: {:}, of optimized classifier is: {:}".format(*totalErrorCount[i]))
+        print("The average error rate of general classifier is: {:.2%}, of optimized classifier is: {:.2%}".format(*averageErrorRate[i]))
+        results[k] = (int(totalErrorCount[i, 0]), float(averageErrorRate[i, 0]),
+                      int(totalErrorCount[i, 1]), float(averageErrorRate[i, 1]))
+    return results
+
 # 应用分类器
-def classifyFlowers(dataFile, forecastFile, k):
+def classifyFlowers(dataFile, forecastFile, k, method='auto', modelPath=None):
     """
     从CSV文件中读取10个鸢尾花的数据，预测并输出比较结果
     :param dataFile: 数据集文件
     :param forecastFile: 分类集文件，表头与dataFile相同
     :param k:
+    :param method: 近邻搜索方式，见 buildIndex
+    :param modelPath: 模型目录，已存在时直接加载模型，否则训练后保存到该目录；None 表示不保存
     :return: None
     """
+    from knn_model import KNNModel
 
     print("Applying classifier on" + forecastFile + " with optimized classifier")
 
-    dataSet, labels, headers = file2matrix(dataFile)
-    normdataSet, minVals, ranges = autoNorm(dataSet)
+    if modelPath is not None and os.path.exists(modelPath):
+        model = KNNModel.load(modelPath)
+    else:
+        dataSet, labels, headers = file2matrix(dataFile)
+        model = KNNModel.fit(dataSet, labels, method, headers)
+        if modelPath is not None:
+            model.save(modelPath)
 
     # 读取分类集数据
     with open(forecastFile, newline='') as csvfile:
@@ -308,34 +694,89 @@ def classifyFlowers(dataFile, forecastFile, k):
         flowers = np.array([row[:-1] for row in data], dtype=float)
         names = [row[-1] for row in data]
 
-    flowers = (flowers - minVals) / ranges
-    # 使用训练集参数，对测试集进行归一化
-
-    # 进行预测
-    for x, y in zip(flowers, names):
-        flowerForecast = classify1(x, normdataSet, labels, k)
+    # 进行预测，模型使用训练集参数对分类集进行归一化
+    flowerForecasts = model.predict(flowers, k, weighted=True)
+    for flowerForecast, y in zip(flowerForecasts, names):
         print("The classifier came back with %s, the real flower is: %s" % (flowerForecast, y))
 
 
-filename = 'iris.csv'
-k = 3
-testRatio = 0.2
-testfilename = 'simulated_iris_data0.csv'
-
-# 使用不同的 k 值测试普通分类器
-# for k0 in range(1, 20, 2):
-    # KNNTest0(filename, k0, testRatio)
-
-# 使用不同的 k 值测试加权距离优化分类器
-# for k1 in range(1, 20, 2):
-    # KNNTest1(filename, k1, testRatio)
-
-# 对比普通分类器以及优化分类器的性能
-print("Testing the classifier performance...")
-print("Compare performances of the two different classifiers on " + filename)
-for k2 in range(1, 20, 2):
-    KNNTest01(filename, k2, testRatio)
-
-# 应用分类器分类
-print("\nApplying classifier...")
-classifyFlowers(filename, testfilename, k)
+# 命令行入口
+def main(argv=None):
+    """
+    python myKNN.py evaluate|sweep|predict|generate ...，不带子命令时运行原来的演示：对比不同 k 值的两种分类器并应用分类器
+    :param argv: 命令行参数列表，None 表示 sys.argv[1:]
+    :return: None
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description='KNN classifier for the iris data set')
+    subparsers = parser.add_subparsers(dest='command')
+
+    evaluate = subparsers.add_parser('evaluate', help='test the classifiers on random splits')
+    evaluate.add_argument('filename')
+    evaluate.add_argument('-k', type=int, default=3)
+    evaluate.add_argument('--classifier', choices=['general', 'optimized', 'both'], default='both')
+    evaluate.add_argument('--test-ratio', type=float, default=0.2)
+    evaluate.add_argument('--test-times', type=int, default=10)
+    evaluate.add_argument('--workers', type=int, help='run the trials on a process pool')
+    evaluate.add_argument('--seed', type=int)
+
+    sweep = subparsers.add_parser('sweep', help='compare the two classifiers over several k values')
+    sweep.add_argument('filename')
+    sweep.add_argument('--ks', type=int, nargs='+', default=list(range(1, 20, 2)))
+    sweep.add_argument('--test-ratio', type=float, default=0.2)
+    sweep.add_argument('--test-times', type=int, default=10)
+
+    predict = subparsers.add_parser('predict', help='classify the samples of a CSV file')
+    predict.add_argument('dataFile')
+    predict.add_argument('forecastFile')
+    predict.add_argument('-k', type=int, default=3)
+    predict.add_argument('--method', choices=['auto', 'kdtree', 'rpforest', 'brute'], default='auto')
+    predict.add_argument('--model', help='model directory, loaded if it exists, otherwise fitted and saved')
+
+    generate = subparsers.add_parser('generate', help='generate simulated iris samples')
+    generate.add_argument('output', help='CSV file, or prefix of the binary files with --binary')
+    generate.add_argument('--num-samples', type=int, default=10)
+    generate.add_argument('--binary', action='store_true')
+    generate.add_argument('--block-size', type=int, default=1000000)
+    generate.add_argument('--seed', type=int)
+
+    args = parser.parse_args(argv)
+    if args.command == 'evaluate':
+        test = {'general': KNNTest0, 'optimized': KNNTest1, 'both': KNNTest01}[args.classifier]
+        test(args.filename, args.k, args.test_ratio, args.test_times, args.workers, args.seed)
+    elif args.command == 'sweep':
+        KNNSweep(args.filename, args.ks, args.test_ratio, args.test_times)
+    elif args.command == 'predict':
+        classifyFlowers(args.dataFile, args.forecastFile, args.k, args.method, args.model)
+    elif args.command == 'generate':
+        from data_generator import labels, samples, write_samples_binary, write_samples_csv
+        write = write_samples_binary if args.binary else write_samples_csv
+        numRows = write(args.output, samples, labels, args.num_samples, args.block_size, seed=args.seed)
+        print("Generated {:} samples in {:}".format(numRows, args.output))
+    else:
+        filename = 'iris.csv'
+        k = 3
+        testRatio = 0.2
+        testfilename = 'simulated_iris_data0.csv'
+
+        # 使用不同的 k 值测试普通分类器
+        # for k0 in range(1, 20, 2):
+            # KNNTest0(filename, k0, testRatio)
+
+        # 使用不同的 k 值测试加权距离优化分类器
+        # for k1 in range(1, 20, 2):
+            # KNNTest1(filename, k1, testRatio)
+
+        # 对比普通分类器以及优化分类器的性能
+        print("Testing the classifier performance...")
+        print("Compare performances of the two different classifiers on " + filename)
+        KNNSweep(filename, range(1, 20, 2), testRatio)
+
+        # 应用分类器分类
+        print("\nApplying classifier...")
+        classifyFlowers(filename, testfilename, k)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+# 在线 KNN：训练样本不断追加，无需重新读入和归一化全部数据
+# 样本存放在按倍数扩容的数组中，同时维护每列的最小值和最大值
+# MinMax 归一化中最小值只是平移，不改变样本之间的距离；只有某列的范围变化超过阈值时才重新缩放已存储的数据
+# 索引只覆盖前面的样本，新追加的样本暴力搜索，两部分结果合并；新样本积累到一定比例时在锁外重建索引
+
+import threading
+import numpy as np
+
+from myKNN import buildIndex, kNeighbors, mergeNeighbors, voteLabels
+
+
+class OnlineKNN:
+    """
+    可以边追加样本边预测的 KNN 分类器
+    """
+
+    def __init__(self, numFeatures, method='auto', rescaleTol=0.05, rebuildRatio=0.25, minIndexSize=1024,
+                 capacity=1024, dtype=float, **indexArgs):
+        """
+        :param numFeatures: 特征数目
+        :param method: 近邻搜索方式，见 buildIndex
+        :param rescaleTol: 某列范围的相对变化超过该值时重新缩放已存储的数据
+        :param rebuildRatio: 未进入索引的样本数超过已索引样本数的该比例时重建索引
+        :param minIndexSize: 样本数达到该值后才建立索引
+        :param capacity: 初始容量
+        :param dtype: 特征的数据类型
+        :param indexArgs: 传给索引构造函数的参数
+        """
+        self.method = method
+        self.rescaleTol = rescaleTol
+        self.rebuildRatio = rebuildRatio
+        self.minIndexSize = minIndexSize
+        self.indexArgs = indexArgs
+
+        self.rawData = np.empty((capacity, numFeatures), dtype=dtype)
+        self.normData = np.empty((capacity, numFeatures), dtype=dtype)
+        self.labelCodes = np.empty(capacity, dtype=np.intp)
+        self.classes = []
+        self.classCodes = {}
+        self.size = 0
+
+        self.dataMin = np.full(numFeatures, np.inf)
+        self.dataMax = np.full(numFeatures, -np.inf)
+        # 所有样本的最小值和最大值
+        self.minVals = np.zeros(numFeatures)
+        self.ranges = np.ones(numFeatures)
+        # 当前存储的数据使用的归一化参数
+
+        self.index = None
+        self.indexedSize = 0
+        self.building = False
+        # 是否有线程正在锁外重建索引，同一时间只重建一个
+        self.scaleVersion = 0
+        # 每次重新缩放后加 1，缩放前的样本上建立的索引不再使用
+        self.version = 0
+        # 每次追加样本后加 1，QueryCache 据此丢弃旧的预测结果
+        self.lock = threading.Lock()
+        # 写操作互斥；预测只在锁内取快照，计算在锁外进行
+
+    def _grow(self, size):
+        capacity = self.rawData.shape[0]
+        while capacity < size:
+            capacity *= 2
+        for name in ('rawData', 'normData', 'labelCodes'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+            # 分配新数组而不是原地扩容，已取得快照的预测不受影响
+
+    def _needRescale(self):
+        newRanges = self.dataMax - self.dataMin
+        newRanges[newRanges == 0] = 1.0
+        return bool((np.abs(newRanges - self.ranges) > self.rescaleTol * self.ranges).any())
+
+    def _rescale(self):
+        self.minVals = self.dataMin.copy()
+        self.ranges = self.dataMax - self.dataMin
+        self.ranges[self.ranges == 0] = 1.0
+        normData = np.empty_like(self.normData)
+        normData[:self.size] = (self.rawData[:self.size] - self.minVals) / self.ranges
+        self.normData = normData
+        self.index = None
+        self.indexedSize = 0
+        self.scaleVersion += 1
+        # 缩放后写入新数组，并丢弃旧索引
+
+    def partialFit(self, dataSet, labels):
+        """
+        追加一批样本
+        :param dataSet: ndarray, (m, d) 未归一化的样本
+        :param labels: list, 样本对应的标签
+        :return: None
+        """
+        dataSet = np.atleast_2d(dataSet)
+        with self.lock:
+            start, end = self.size, self.size + dataSet.shape[0]
+            if end > self.rawData.shape[0]:
+                self._grow(end)
+            self.rawData[start:end] = dataSet
+            self.labelCodes[start:end] = [self.classCodes.setdefault(label, len(self.classCodes))
+                                          for label in labels]
+            self.classes.extend(list(self.classCodes)[len(self.classes):])
+
+            np.minimum(self.dataMin, dataSet.min(axis=0), out=self.dataMin)
+            np.maximum(self.dataMax, dataSet.max(axis=0), out=self.dataMax)
+            self.normData[start:end] = (dataSet - self.minVals) / self.ranges
+            self.size = end
+            # 先写入数据再更新 size，预测的快照只会看到完整的样本
+            self.version += 1
+
+            if self._needRescale():
+                self._rescale()
+            numPending = self.size - self.indexedSize
+            if self.building or self.size < self.minIndexSize or numPending <= self.rebuildRatio * self.indexedSize:
+                return
+            self.building = True
+            normData, size, scaleVersion = self.normData[:self.size], self.size, self.scaleVersion
+            # 已写入的样本不会再被修改，扩容和缩放都换成新数组，可以在锁外读取
+
+        index = None
+        try:
+            index = buildIndex(normData, self.method, **self.indexArgs)
+        finally:
+            with self.lock:
+                self.building = False
+                if index is not None and self.scaleVersion == scaleVersion:
+                    self.index, self.indexedSize = index, size
+                # 暴力搜索时不建立索引，全部样本都在未索引部分；建索引期间重新缩放过时丢弃该索引
+
+    def _snapshot(self):
+        with self.lock:
+            return (self.normData, self.labelCodes, self.size, self.index, self.indexedSize,
+                    self.minVals, self.ranges, np.array(self.classes))
+
+    def normalize(self, inX):
+        """
+        使用当前的归一化参数对分类数据进行归一化
+        """
+        with self.lock:
+            minVals, ranges = self.minVals, self.ranges
+        return ((np.atleast_2d(inX) - minVals) / ranges).astype(self.normData.dtype, copy=False)
+
+    def predict(self, inX, k, weighted=False):
+        """
+        :param inX: ndarray, (m, d) 未归一化的分类数据
+        :param k: 选择最近邻居的数目
+        :param weighted: 是否使用距离权值优化
+        :return: ndarray, (m,) 预测的标签
+        """
+        normData, labelCodes, size, index, indexedSize, minVals, ranges, classes = self._snapshot()
+        inX = ((np.atleast_2d(inX) - minVals) / ranges).astype(normData.dtype, copy=False)
+
+        distancesList, indicesList = [], []
+        if index is not None:
+            distances, indices = index.query(inX, k)
+            distancesList.append(distances)
+            indicesList.append(indices)
+        if indexedSize < size:
+            distances, indices = kNeighbors(inX, normData[indexedSize:size], k)
+            distancesList.append(distances)
+            indicesList.append(indices + indexedSize)
+            # 尚未进入索引的样本暴力搜索
+        distances, indices = mergeNeighbors(distancesList, indicesList, k)
+        return classes[voteLabels(indices, distances, labelCodes[:size], weighted)]
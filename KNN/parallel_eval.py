@@ -0,0 +1,98 @@
+# 多进程并行执行多次随机划分测试
+# 归一化后的数据集只复制一次到共享内存，各个工作进程直接映射使用，不再逐个任务序列化
+# 每次测试使用由 SeedSequence 派生的独立种子，结果与工作进程数目无关，可以复现
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import numpy as np
+
+from instrument import phase
+from myKNN import dataSetSplit, kNeighbors, voteLabels
+
+_shared = {}
+# 工作进程中的共享数据：共享内存对象、数据集视图和标签
+
+
+def _initWorker(shmName, shape, dtype, labels):
+    shm = shared_memory.SharedMemory(name=shmName)
+    _shared['shm'] = shm
+    # 保留引用，否则共享内存会被提前关闭
+    _shared['dataSet'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _shared['labels'] = labels
+
+
+def runTrial(dataSet, labels, k, testRatio, seed, trial=None):
+    """
+    单次随机划分测试，同一划分同时测试普通分类器和加权优化分类器
+    :param dataSet: ndarray, 归一化后的数据集
+    :param labels: ndarray, encodeLabels 编码后的标签
+    :param k:
+    :param testRatio:
+    :param seed: 本次划分的随机种子
+    :param trial: 第几次测试，记录在阶段信息中
+    :return: ((errorCount0, errorRate0), (errorCount1, errorRate1))
+    """
+    rng = np.random.default_rng(seed)
+    with phase('dataSetSplit', trial=trial):
+        xTrain, yTrain, xTest, yTest = dataSetSplit(dataSet, labels, testRatio, rng)
+    with phase('kNeighbors', trial=trial, k=k, numTest=len(yTest)):
+        distances, indices = kNeighbors(xTest, xTrain, k)
+    yTest = np.asarray(yTest)
+
+    results = []
+    for weighted in (False, True):
+        with phase('voteLabels', trial=trial, k=k, weighted=weighted):
+            yForecast = voteLabels(indices, distances, yTrain, weighted)
+        errorCount = int((yForecast != yTest).sum())
+        results.append((errorCount, errorCount / float(len(yTest))))
+    return tuple(results)
+
+
+def callShared(args):
+    """
+    在工作进程中调用 func(dataSet, labels, *args)，dataSet 和 labels 为共享的数据
+    :param args: (func, *args)，func 必须是模块级函数
+    """
+    func, args = args[0], args[1:]
+    return func(_shared['dataSet'], _shared['labels'], *args)
+
+
+@contextmanager
+def sharedPool(dataSet, labels, workers=None):
+    """
+    创建进程池，数据集只复制一次到共享内存，各工作进程直接映射使用
+    任务通过 executor.map(callShared, [(func, *args), ...]) 提交
+    :param dataSet: ndarray, 归一化后的数据集
+    :param labels: ndarray, encodeLabels 编码后的标签
+    :param workers: 工作进程数目，None 表示使用全部 CPU
+    :return: ProcessPoolExecutor
+    """
+    dataSet = np.ascontiguousarray(dataSet)
+    shm = shared_memory.SharedMemory(create=True, size=max(dataSet.nbytes, 1))
+    try:
+        np.ndarray(dataSet.shape, dtype=dataSet.dtype, buffer=shm.buf)[...] = dataSet
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker,
+                                 initargs=(shm.name, dataSet.shape, dataSet.dtype, np.asarray(labels))) as executor:
+            yield executor
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def parallelTrials(dataSet, labels, k, testRatio=0.2, testTimes=10, workers=None, seed=None):
+    """
+    在进程池中并行执行 testTimes 次随机划分测试
+    :param dataSet: ndarray, 归一化后的数据集
+    :param labels: ndarray, encodeLabels 编码后的标签
+    :param k:
+    :param testRatio:
+    :param testTimes: 测试次数
+    :param workers: 工作进程数目，None 表示使用全部 CPU
+    :param seed: 随机种子，相同的种子得到相同的结果
+    :return: list, 按测试顺序排列的 runTrial 结果
+    """
+    seeds = np.random.SeedSequence(seed).spawn(testTimes)
+    with sharedPool(dataSet, labels, workers) as executor:
+        return list(executor.map(callShared, [(runTrial, k, testRatio, trialSeed, trial)
+                                              for trial, trialSeed in enumerate(seeds)]))
@@ -0,0 +1,153 @@
+# 降维预处理
+# 特征数很多时距离计算的开销与特征数成正比，在 autoNorm 之后把数据投影到较低的维度上再计算距离
+# PCA：求中心化后训练集的协方差矩阵的特征分解(等价于 SVD，样本数远多于特征数时更快)，取方差最大的若干个主成分方向
+# 稀疏随机投影：投影矩阵的元素以 1/s 的概率取 ±sqrt(s/r)，其余为 0，s = sqrt(d)，近似保持样本之间的距离
+# 投影只由训练集确定，训练数据和分类数据使用同一个投影
+
+import time
+import numpy as np
+
+from myKNN import autoNorm, classifyBatch, dataSetSplit, file2codes
+
+
+class Projection:
+    """
+    线性投影 (x - mean) @ components
+    """
+
+    def __init__(self, components, mean, method, explainedVarianceRatio=None):
+        self.components = components
+        # (d, r) 投影矩阵
+        self.mean = mean
+        self.method = method
+        self.explainedVarianceRatio = explainedVarianceRatio
+        # PCA 每个主成分解释的方差比例，随机投影时为 None
+
+    def transform(self, inX):
+        """
+        :param inX: ndarray, (m, d) 归一化后的数据
+        :return: ndarray, (m, r) 投影后的数据
+        """
+        return ((np.atleast_2d(inX) - self.mean) @ self.components).astype(self.components.dtype, copy=False)
+
+    def getState(self):
+        state = {'components': self.components, 'mean': self.mean}
+        if self.explainedVarianceRatio is not None:
+            state['explainedVarianceRatio'] = self.explainedVarianceRatio
+        return state
+
+    @classmethod
+    def fromState(cls, method, state):
+        return cls(state['components'], state['mean'], method, state.get('explainedVarianceRatio'))
+
+
+def fitPCA(dataSet, numComponents=None, varianceRatio=0.95):
+    """
+    :param dataSet: ndarray, (n, d) 归一化后的训练样本集
+    :param numComponents: 保留的主成分数目，None 时由 varianceRatio 决定
+    :param varianceRatio: 保留的主成分至少解释的方差比例
+    :return: Projection
+    """
+    mean = dataSet.mean(axis=0)
+    centered = dataSet - mean
+    if dataSet.shape[0] > dataSet.shape[1]:
+        variance, components = np.linalg.eigh(centered.T @ centered)
+        variance, components = np.maximum(variance[::-1], 0.0), components[:, ::-1]
+        # eigh 返回升序的特征值
+    else:
+        _, singularValues, components = np.linalg.svd(centered, full_matrices=False)
+        variance, components = singularValues ** 2, components.T
+    ratio = variance / variance.sum() if variance.sum() > 0 else np.zeros_like(variance)
+    if numComponents is None:
+        numComponents = int(np.searchsorted(np.cumsum(ratio), varianceRatio)) + 1
+    numComponents = min(numComponents, components.shape[1])
+    return Projection(components[:, :numComponents].astype(dataSet.dtype), mean.astype(dataSet.dtype), 'pca',
+                      ratio[:numComponents])
+
+
+def fitRandomProjection(dataSet, numComponents, density=None, seed=None):
+    """
+    :param dataSet: ndarray, (n, d) 归一化后的训练样本集
+    :param numComponents: 投影后的维度
+    :param density: 投影矩阵非零元素的比例，None 时为 1 / sqrt(d)
+    :param seed: 随机种子
+    :return: Projection
+    """
+    d = dataSet.shape[1]
+    density = density if density is not None else 1.0 / np.sqrt(d)
+    rng = np.random.default_rng(seed)
+    nonzero = rng.random((d, numComponents)) < density
+    signs = rng.choice((-1.0, 1.0), (d, numComponents))
+    components = np.where(nonzero, signs, 0.0) / np.sqrt(density * numComponents)
+    # 缩放后投影前后的距离平方期望相等
+    return Projection(components.astype(dataSet.dtype), dataSet.mean(axis=0).astype(dataSet.dtype), 'random')
+
+
+def fitProjection(dataSet, method='pca', numComponents=None, varianceRatio=0.95, seed=None):
+    """
+    :param method: 'pca' 或 'random'
+    :param numComponents: 投影后的维度，PCA 时可以为 None，由 varianceRatio 决定
+    :return: Projection
+    """
+    if method == 'pca':
+        return fitPCA(dataSet, numComponents, varianceRatio)
+    if method == 'random':
+        if numComponents is None:
+            raise ValueError("random projection needs numComponents")
+        return fitRandomProjection(dataSet, numComponents, seed=seed)
+    raise ValueError("unknown projection method: %s" % method)
+
+
+def projectionReport(filename, k, numComponentsList, method='pca', testRatio=0.2, testTimes=10, seed=None):
+    """
+    使用与 KNNTest0 相同的随机划分测试：每次划分后在训练集上拟合投影，对比投影前后的错误率和分类耗时
+    投影后的分类耗时包括投影分类数据的时间；拟合投影和投影训练集只需在训练时进行一次，单独统计
+    :param filename:
+    :param k:
+    :param numComponentsList: 需要测试的投影维度
+    :param method: 'pca' 或 'random'
+    :param testRatio:
+    :param testTimes:
+    :param seed: 随机种子
+    :return: list, 每个投影维度的 {'numComponents', 'explainedVariance', 'errorRate', 'fullErrorRate', 'fitSeconds',
+             'speedup'}
+    """
+    print("\nTest {:} projection on {:}".format(method, filename))
+    print("parameter: k = {:}, test ratio = {:}".format(k, testRatio))
+
+    dataSet, labelCodes, classes, headers = file2codes(filename)
+    normdataSet, minVals, ranges = autoNorm(dataSet)
+    rng = np.random.default_rng(seed)
+    splits = [dataSetSplit(normdataSet, labelCodes, testRatio, rng) for _ in range(0, testTimes)]
+
+    fullErrors, fullSeconds = 0, 0.0
+    for xTrain, yTrain, xTest, yTest in splits:
+        start = time.perf_counter()
+        fullErrors += (classifyBatch(xTest, xTrain, yTrain, k) != yTest).sum()
+        fullSeconds += time.perf_counter() - start
+    numTest = sum(len(split[3]) for split in splits)
+    print("Without projection: d = {:}, error rate {:.2%}, {:.3g} s".format(
+        normdataSet.shape[1], fullErrors / numTest, fullSeconds))
+
+    results = []
+    for numComponents in numComponentsList:
+        errors, fitSeconds, seconds, explained = 0, 0.0, 0.0, 0.0
+        for xTrain, yTrain, xTest, yTest in splits:
+            start = time.perf_counter()
+            projection = fitProjection(xTrain, method, numComponents, seed=rng.integers(2 ** 32))
+            projectedTrain = projection.transform(xTrain)
+            middle = time.perf_counter()
+            errors += (classifyBatch(projection.transform(xTest), projectedTrain, yTrain, k) != yTest).sum()
+            end = time.perf_counter()
+            fitSeconds += middle - start
+            seconds += end - middle
+            if projection.explainedVarianceRatio is not None:
+                explained += projection.explainedVarianceRatio.sum() / testTimes
+        result = {'numComponents': numComponents, 'explainedVariance': explained if method == 'pca' else None,
+                  'errorRate': errors / numTest, 'fullErrorRate': fullErrors / numTest,
+                  'fitSeconds': fitSeconds, 'speedup': fullSeconds / seconds}
+        results.append(result)
+        print("d = {:}: explained variance {:}, error rate {:.2%}, fit {:.3g} s, classify {:.3g} s, "
+              "speedup {:.2f}x".format(numComponents, "{:.2%}".format(explained) if method == 'pca' else '-',
+                                       result['errorRate'], fitSeconds, seconds, result['speedup']))
+    return results
@@ -0,0 +1,89 @@
+# 预测结果缓存
+# 以归一化后的分类数据为键缓存预测结果，LRU 淘汰；quantum 不为 None 时先按 quantum 量化，相近的分类数据共用一个缓存项
+# 模型的 version 变化(训练数据或归一化参数改变)时自动清空缓存
+# 可以包装 KNNModel 或 OnlineKNN，模型需要提供 normalize、predict 和 version
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class QueryCache:
+    """
+    带 LRU 缓存的预测，用法: cache = QueryCache(model); cache.predict(inX, k)
+    """
+
+    def __init__(self, model, maxSize=100000, quantum=None):
+        """
+        :param model: KNNModel 或 OnlineKNN
+        :param maxSize: 最多缓存的分类数据个数
+        :param quantum: 量化步长(归一化后的单位)，None 表示只有完全相同的分类数据才命中
+        """
+        self.model = model
+        self.maxSize = maxSize
+        self.quantum = quantum
+        self.entries = OrderedDict()
+        self.version = model.version
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _keys(self, normX, k, weighted):
+        if self.quantum is not None:
+            normX = np.round(normX / self.quantum).astype(np.int64)
+        normX = np.ascontiguousarray(normX)
+        return [(row.tobytes(), k, weighted) for row in normX]
+
+    def predict(self, inX, k, weighted=False):
+        """
+        与 model.predict 相同，命中的分类数据直接返回缓存的结果
+        :return: ndarray, (m,) 预测的标签
+        """
+        version = self.model.version
+        inX = np.atleast_2d(inX)
+        keys = self._keys(self.model.normalize(inX), k, weighted)
+
+        results = [None] * len(keys)
+        missing = {}
+        # 未命中的键 -> 分类数据中的行号，同一批中重复的分类数据只预测一次
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+            for row, key in enumerate(keys):
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    results[row] = self.entries[key]
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(row)
+                    self.misses += 1
+
+        if missing:
+            rows = [rowList[0] for rowList in missing.values()]
+            forecasts = self.model.predict(inX[rows], k, weighted)
+            with self.lock:
+                store = self.model.version == self.version == version
+                # 预测期间模型发生变化时不写入缓存
+                for (key, rowList), forecast in zip(missing.items(), forecasts):
+                    for row in rowList:
+                        results[row] = forecast
+                    if store:
+                        self.entries[key] = forecast
+                        self.entries.move_to_end(key)
+                while len(self.entries) > self.maxSize:
+                    self.entries.popitem(last=False)
+        return np.array(results)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """
+        :return: dict, 命中次数、未命中次数、命中率和缓存项数
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hitRate': self.hits / total if total else 0.0,
+                    'size': len(self.entries)}
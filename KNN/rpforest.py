@@ -0,0 +1,136 @@
+# 随机投影森林，近似最近邻搜索
+# 每棵树用随机超平面递归切分样本，查询时沿多棵树收集候选样本，只在候选集上计算精确距离
+# numTrees 和 searchK 越大，召回率越高，查询越慢
+
+import heapq
+import numpy as np
+
+
+class RPForest:
+    """
+    随机投影树组成的森林，查询结果是近似的 k 近邻
+    """
+
+    def __init__(self, dataSet, numTrees=10, leafSize=32, searchK=None, seed=None):
+        """
+        :param dataSet: ndarray, (n, d) 归一化后的训练样本集
+        :param numTrees: 树的数目
+        :param leafSize: 叶子节点最多包含的样本数
+        :param searchK: 每次查询最少收集的候选样本数，默认为 numTrees * leafSize
+        :param seed: 随机种子
+        """
+        self.dataSet = np.asarray(dataSet)
+        self.numTrees = numTrees
+        self.leafSize = leafSize
+        self.searchK = searchK if searchK is not None else numTrees * leafSize
+        self.rng = np.random.default_rng(seed)
+
+        self.normals = []
+        self.offsets = []
+        self.children = []
+        self.leaves = []
+        # 所有树的节点放在同一组列表中，叶子节点的 children 为 (-1, 叶子编号)
+        self.roots = [self._buildTree() for _ in range(numTrees)]
+
+        self.normals = np.array(self.normals).reshape(-1, self.dataSet.shape[1])
+        self.offsets = np.array(self.offsets)
+        self.children = np.array(self.children, dtype=np.intp).reshape(-1, 2)
+
+    def _newNode(self):
+        self.normals.append(np.zeros(self.dataSet.shape[1]))
+        self.offsets.append(0.0)
+        self.children.append((-1, -1))
+        return len(self.children) - 1
+
+    def _buildTree(self):
+        root = self._newNode()
+        stack = [(root, np.arange(self.dataSet.shape[0]))]
+        while stack:
+            node, indices = stack.pop()
+            if indices.size > self.leafSize:
+                a, b = self.dataSet[self.rng.choice(indices, 2, replace=False)]
+                normal = a - b
+                # 以两个随机样本连线的方向作为超平面法向量
+                norm = np.linalg.norm(normal)
+                if norm > 0:
+                    normal /= norm
+                    projections = self.dataSet[indices] @ normal
+                    offset = np.median(projections)
+                    isLeft = projections <= offset
+                    if 0 < isLeft.sum() < indices.size:
+                        self.normals[node] = normal
+                        self.offsets[node] = offset
+                        left, right = self._newNode(), self._newNode()
+                        self.children[node] = (left, right)
+                        stack.append((left, indices[isLeft]))
+                        stack.append((right, indices[~isLeft]))
+                        continue
+
+            self.children[node] = (-1, len(self.leaves))
+            self.leaves.append(indices)
+        return root
+
+    def _candidates(self, x, k):
+        heap = [(-np.inf, root) for root in self.roots]
+        # 优先级为查询点越过路径上切分超平面的最大距离，查询点所在一侧的优先级不增加
+        heapq.heapify(heap)
+        candidates = set()
+        while heap and len(candidates) < max(self.searchK, k):
+            priority, node = heapq.heappop(heap)
+            left, right = self.children[node]
+            if left < 0:
+                candidates.update(self.leaves[right].tolist())
+                continue
+            margin = x @ self.normals[node] - self.offsets[node]
+            heapq.heappush(heap, (max(priority, margin), left))
+            heapq.heappush(heap, (max(priority, -margin), right))
+        return np.fromiter(candidates, dtype=np.intp, count=len(candidates))
+
+    def query(self, inX, k):
+        """
+        近似查找每个分类数据最近的 k 个邻居，按距离升序排列
+        :param inX: ndarray, (m, d) 分类数据
+        :param k: 选择最近邻居的数目
+        :return: distances, indices 均为 (m, k) 的 ndarray
+        """
+        inX = np.atleast_2d(inX)
+        k = min(k, self.dataSet.shape[0])
+        distances = np.empty((inX.shape[0], k))
+        indices = np.empty((inX.shape[0], k), dtype=np.intp)
+        for i, x in enumerate(inX):
+            candidates = self._candidates(x, k)
+            candDistances = np.sqrt(((self.dataSet[candidates] - x) ** 2).sum(axis=1))
+            order = np.lexsort((candidates, candDistances))[:k]
+            distances[i] = candDistances[order]
+            indices[i] = candidates[order]
+        return distances, indices
+
+    def getState(self):
+        """
+        :return: dict, 保存森林所需的数组，不包含样本集本身
+        """
+        leafSizes = np.array([leaf.size for leaf in self.leaves], dtype=np.intp)
+        return {'normals': self.normals, 'offsets': self.offsets, 'children': self.children,
+                'roots': np.array(self.roots, dtype=np.intp),
+                'leafIndices': np.concatenate(self.leaves), 'leafOffsets': np.cumsum(leafSizes)[:-1],
+                'params': np.array([self.numTrees, self.leafSize, self.searchK])}
+
+    @classmethod
+    def fromState(cls, dataSet, state, seed=None):
+        """
+        由 getState 保存的数组恢复森林，不需要重新建树
+        :param dataSet: ndarray, 建树时使用的样本集
+        :param state: dict, getState 的返回值
+        :param seed: 随机种子
+        :return: RPForest
+        """
+        forest = cls.__new__(cls)
+        forest.dataSet = dataSet
+        forest.numTrees, forest.leafSize, forest.searchK = (int(x) for x in state['params'])
+        forest.rng = np.random.default_rng(seed)
+        forest.normals = state['normals']
+        forest.offsets = state['offsets']
+        forest.children = state['children']
+        forest.roots = state['roots'].tolist()
+        forest.leaves = np.split(state['leafIndices'], state['leafOffsets'])
+        return forest
@@ -0,0 +1,89 @@
+# 多进程分片的暴力近邻搜索
+# 训练集按行切分为 numShards 片，每片由一个常驻的工作进程持有，查询时每个进程在自己的分片上计算局部 k 近邻
+# 主进程用 mergeNeighbors 合并为全局 k 近邻，距离相同时取下标较小的样本，与分块的 kNeighbors 结果相同
+# 实现了 query(inX, k) 接口，可以作为 classifyBatch 的 index 参数使用
+
+import multiprocessing
+import os
+import numpy as np
+
+from myKNN import MEMORY_BUDGET, kNeighbors, mergeNeighbors
+
+
+def _shardWorker(conn, offset, memoryBudget):
+    shard = conn.recv()
+    # 分片通过管道发送，进程对象的参数中不保留对整个训练集的引用
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        queries, k = message
+        try:
+            distances, indices = kNeighbors(queries, shard, k, memoryBudget, workers=1)
+            # 各分片已经在不同进程中并行，进程内不再开线程
+            conn.send((distances, indices + offset))
+            # 换算为全局下标
+        except Exception as error:
+            conn.send(error)
+    conn.close()
+
+
+class ShardedKNN:
+    """
+    分片的近邻搜索，使用完毕后调用 close() 结束工作进程，或使用 with 语句
+    """
+
+    def __init__(self, dataSet, numShards=None, memoryBudget=MEMORY_BUDGET):
+        """
+        :param dataSet: ndarray, (n, d) 归一化后的训练样本集
+        :param numShards: 分片数即工作进程数，None 表示 CPU 数
+        :param memoryBudget: 所有工作进程的距离计算合计最多占用的字节数
+        """
+        dataSet = np.asarray(dataSet)
+        self.n = n = dataSet.shape[0]
+        # 只记录样本数，分片交给工作进程后主进程不再持有训练集
+        self.numShards = max(min(numShards or os.cpu_count() or 1, n), 1)
+        bounds = np.linspace(0, n, self.numShards + 1).astype(np.intp)
+
+        self.connections = []
+        self.processes = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            parentConn, childConn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_shardWorker, daemon=True,
+                                              args=(childConn, int(start), memoryBudget // self.numShards))
+            process.start()
+            childConn.close()
+            parentConn.send(dataSet[start:end])
+            self.connections.append(parentConn)
+            self.processes.append(process)
+
+    def query(self, inX, k):
+        """
+        :param inX: ndarray, (m, d) 分类数据
+        :param k: 选择最近邻居的数目
+        :return: distances, indices 均为 (m, k) 的 ndarray，按距离升序排列
+        """
+        inX = np.atleast_2d(inX)
+        for conn in self.connections:
+            conn.send((inX, k))
+            # 先发送给所有分片，各工作进程同时计算
+        results = [conn.recv() for conn in self.connections]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        distancesList, indicesList = zip(*results)
+        return mergeNeighbors(distancesList, indicesList, min(k, self.n))
+
+    def close(self):
+        for conn in self.connections:
+            conn.send(None)
+            conn.close()
+        for process in self.processes:
+            process.join()
+        self.connections, self.processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()